@@ -0,0 +1,313 @@
+#!/usr/bin/python
+"""
+Benchmarks Papyr against a synthetic wallpaper library.
+
+Each phase runs in a fresh interpreter with HOME pointed at its own
+scratch directory, so every phase starts with empty caches whichever phases
+ran before it, and the real configuration and thumbnail cache are never
+touched. Results are printed (or written) as
+JSON for comparison across commits.
+
+    python3 benchmarks/bench.py --count 1000 --output results.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import contextlib
+import platform
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ["discovery_cold", "discovery_warm", "thumbnails", "first_thumbnail", "setter_dispatch", "daemon_wakeups"]
+
+_process_start = time.perf_counter()
+
+
+def _peak_rss_kib() -> dict:
+    """Peak resident set size of this process and of its finished children."""
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def _timed(func, repeat: int) -> dict:
+    """Runs func repeat times and summarises the wall-clock timings in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"min_ms": min(samples), "median_ms": statistics.median(samples), "runs": repeat}
+
+
+# --- Phases (run inside the child interpreter) ---
+
+def phase_discovery_cold(args) -> dict:
+    from papyr.config import Config
+    from papyr.discovery import discover_images
+
+    # Dropping the page cache affects the whole host and needs root, so it is
+    # opt-in; without it "cold" means a fresh process
+    caches_dropped = False
+    if args.drop_caches:
+        try:
+            os.sync()
+            with open("/proc/sys/vm/drop_caches", "w") as f:
+                f.write("3\n")
+            caches_dropped = True
+        except OSError as e:
+            print(f"Could not drop the page cache: {e}", file=sys.stderr)
+
+    dirs = Config().wallpaper_dirs
+    start = time.perf_counter()
+    found = discover_images(dirs)
+    return {"ms": (time.perf_counter() - start) * 1000, "found": len(found), "caches_dropped": caches_dropped}
+
+
+def phase_discovery_warm(args) -> dict:
+    from papyr.config import Config
+    from papyr.discovery import discover_images
+
+    dirs = Config().wallpaper_dirs
+    discover_images(dirs)
+    return _timed(lambda: discover_images(dirs), args.repeat)
+
+
+def _thumbnail_one(path: str) -> bool:
+    from papyr import thumbnailer
+    try:
+        cache_path = thumbnailer.get_thumbnail_path(path)
+    except OSError:
+        return False
+    thumbnailer.create_thumbnail(path, cache_path)
+    return os.path.exists(cache_path)
+
+
+def phase_thumbnails(args) -> dict:
+    from multiprocessing import Pool
+    from papyr.config import Config
+    from papyr.discovery import discover_images
+    from papyr import thumbnailer
+
+    paths = discover_images(Config().wallpaper_dirs)[:args.thumbnail_sample]
+    results = {"images": len(paths), "workers": {}}
+    for workers in sorted({1, os.cpu_count() or 1}):
+        shutil.rmtree(thumbnailer.CACHE_DIR, ignore_errors=True)
+        os.makedirs(thumbnailer.CACHE_DIR)
+        start = time.perf_counter()
+        with Pool(workers) as pool:
+            created = sum(pool.map(_thumbnail_one, paths, chunksize=8))
+        elapsed = time.perf_counter() - start
+        results["workers"][str(workers)] = {
+            "seconds": elapsed,
+            "images_per_sec": len(paths) / elapsed,
+            "images_per_sec_per_core": len(paths) / elapsed / workers,
+            "failed": len(paths) - created,
+        }
+
+    # Every thumbnail now exists, so this measures the warm lookup path
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            os.path.exists(thumbnailer.get_thumbnail_path(path))
+        except OSError:
+            pass
+    results["warm_lookup_us_per_image"] = (time.perf_counter() - start) / max(1, len(paths)) * 1e6
+    return results
+
+
+def phase_first_thumbnail(args) -> dict:
+    from papyr.config import Config
+    from papyr.discovery import discover_images
+    from papyr import thumbnailer
+
+    first_ms = None
+    for path in discover_images(Config().wallpaper_dirs):
+        if thumbnailer.get_pixbuf_for_image(path):
+            first_ms = (time.perf_counter() - _process_start) * 1000
+            break
+
+    # With the cache now populated for the sample, time the full warm path
+    paths = discover_images(Config().wallpaper_dirs)[:args.thumbnail_sample]
+    for path in paths:
+        thumbnailer.get_pixbuf_for_image(path)
+    start = time.perf_counter()
+    for path in paths:
+        thumbnailer.get_pixbuf_for_image(path)
+    warm_us = (time.perf_counter() - start) / max(1, len(paths)) * 1e6
+    return {"time_to_first_thumbnail_ms": first_ms, "warm_pixbuf_us_per_image": warm_us}
+
+
+def _stub_subprocesses(module):
+    """Replaces process spawning in a module so only Python-side dispatch is timed."""
+    class _Done:
+        returncode = 0
+        stdout = ""
+    module.subprocess.run = lambda *a, **k: _Done()
+    module.subprocess.Popen = lambda *a, **k: _Done()
+    module.shutil.which = lambda name: f"/usr/bin/{name}"
+
+
+def phase_setter_dispatch(args) -> dict:
+    from papyr import setter
+    from papyr.config import Config
+
+    _stub_subprocesses(setter)
+    config = Config()
+    config.enable_pywal = False
+    results = {}
+    calls = 1000
+    # Status messages still go through print(), so they are part of the cost
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name in ["feh", "swaybg", "swaymsg", "gnome"]:
+            config.setter = name
+            single = _timed(lambda: [setter.set_wallpaper("/tmp/a.jpg", config) for _ in range(calls)], args.repeat)
+            batch = _timed(lambda: [setter.set_wallpapers({"A": "/tmp/a.jpg", "B": "/tmp/b.jpg"}, config) for _ in range(calls)], args.repeat)
+            results[name] = {
+                "set_wallpaper_us": single["min_ms"] * 1000 / calls,
+                "set_wallpapers_us": batch["min_ms"] * 1000 / calls,
+            }
+    return results
+
+
+class _VirtualHourElapsed(Exception):
+    pass
+
+
+def phase_daemon_wakeups(args) -> dict:
+    import select
+    from papyr import daemon
+
+    clock = [0.0]
+    counts = {"wakeups": 0, "changes": 0}
+
+    def fake_select(rlist, wlist, xlist, timeout=None):
+        counts["wakeups"] += 1
+        if timeout is None or clock[0] + timeout >= 3600:
+            raise _VirtualHourElapsed()
+        clock[0] += timeout
+        return [], [], []
+
+    def fake_set(*a, **k):
+        counts["changes"] += 1
+
+    daemon.time.monotonic = lambda: clock[0]
+    select.select = fake_select
+    daemon.set_wallpaper = fake_set
+    daemon.set_wallpapers = fake_set
+    daemon.setter.detect_outputs = lambda: {}
+
+    try:
+        daemon.run_loop()
+    except _VirtualHourElapsed:
+        pass
+    return {"wakeups_per_hour": counts["wakeups"], "changes_per_hour": counts["changes"], "interval_min": args.interval}
+
+
+# --- Driver ---
+
+def _run_phase(name: str, args, home: str) -> dict:
+    """Runs one phase in a child interpreter and returns its JSON result."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--phase", name,
+           "--repeat", str(args.repeat), "--thumbnail-sample", str(args.thumbnail_sample),
+           "--interval", str(args.interval)]
+    if args.drop_caches:
+        cmd.append("--drop-caches")
+    env = dict(os.environ, HOME=home, PYTHONPATH=REPO_ROOT)
+    env.pop("PAPYR_TRACE", None)
+    env.pop("PAPYR_TRACE_SUMMARY", None)
+    result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, check=True, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Papyr on a synthetic wallpaper library.")
+    parser.add_argument("--count", type=int, default=1000, help="Number of images in the library (default: 1000).")
+    parser.add_argument("--resolutions", default="1920x1080,2560x1440,3840x2160,1080x1920", help="Comma-separated WxH mix.")
+    parser.add_argument("--formats", default="jpg,png,bmp", help="Comma-separated formats: jpg, png, bmp, webp, gif.")
+    parser.add_argument("--corrupt", type=float, default=0.02, help="Fraction of corrupt files (default: 0.02).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic library.")
+    parser.add_argument("--library-dir", help="Where to keep the library (default: ~/.cache/papyr-bench/<params>).")
+    parser.add_argument("--jobs", type=int, help="Processes used to generate the library.")
+    parser.add_argument("--phases", default=",".join(PHASES), help="Comma-separated phases to run.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions for warm timings.")
+    parser.add_argument("--thumbnail-sample", type=int, default=500, help="Images used for thumbnail timings.")
+    parser.add_argument("--interval", type=float, default=10, help="Slideshow interval for the daemon phase, in minutes.")
+    parser.add_argument("--drop-caches", action="store_true",
+                        help="Drop the host's page cache before discovery_cold (needs root; affects the whole system).")
+    parser.add_argument("--output", help="Write results to this file instead of stdout.")
+    parser.add_argument("--phase", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        result = globals()[f"phase_{args.phase}"](args)
+        result["peak_rss_kib"] = _peak_rss_kib()
+        print(json.dumps(result))
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from synth import generate_library, parse_resolutions
+
+    resolutions = parse_resolutions(args.resolutions)
+    formats = args.formats.split(",")
+    # Every generation parameter is part of the name, so switching between
+    # configurations reuses each library instead of regenerating one
+    library_key = "-".join([
+        f"n{args.count}", f"s{args.seed}", f"c{args.corrupt:g}",
+        "_".join(formats), "_".join(f"{w}x{h}" for w, h in resolutions),
+    ])
+    library_dir = args.library_dir or os.path.expanduser(f"~/.cache/papyr-bench/{library_key}")
+    print(f"Preparing library of {args.count} images in {library_dir}...", file=sys.stderr)
+    manifest = generate_library(library_dir, args.count, resolutions, formats, args.corrupt, args.seed, args.jobs)
+
+    results = {
+        "meta": {
+            **_git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "library": {"path": library_dir, **manifest},
+        "phases": {},
+    }
+
+    config = f'wallpaper_dirs = ["{library_dir}"]\n\n[slideshow]\ninterval = {args.interval}\n\n[setter]\ncommand = "feh"\n'
+    for name in args.phases.split(","):
+        print(f"Running {name}...", file=sys.stderr)
+        # A new HOME per phase, so no phase sees the caches another left behind
+        with tempfile.TemporaryDirectory(prefix="papyr-bench-home-") as home:
+            config_dir = os.path.join(home, ".config", "papyr")
+            os.makedirs(config_dir)
+            with open(os.path.join(config_dir, "config.toml"), "w") as f:
+                f.write(config)
+            results["phases"][name] = _run_phase(name, args, home)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Generates reproducible synthetic wallpaper libraries for benchmarking."""
+import os
+import json
+import random
+from multiprocessing import Pool
+from PIL import Image
+
+MANIFEST_NAME = ".papyr-bench.json"
+DEFAULT_RESOLUTIONS = [(1920, 1080), (2560, 1440), (3840, 2160), (1080, 1920)]
+FORMATS = {"jpg": "JPEG", "png": "PNG", "bmp": "BMP", "webp": "WEBP", "gif": "GIF"}
+
+
+def parse_resolutions(spec: str) -> list[tuple[int, int]]:
+    """Parses '1920x1080,1080x1920' into a list of (width, height) tuples."""
+    resolutions = []
+    for item in spec.split(","):
+        width, height = item.lower().split("x")
+        resolutions.append((int(width), int(height)))
+    return resolutions
+
+
+def _make_image(job: tuple):
+    """Writes one synthetic image. Corrupt files are truncated or pure noise."""
+    directory, index, seed, resolutions, formats, corrupt_fraction = job
+    rng = random.Random(seed * 1_000_003 + index)
+    width, height = rng.choice(resolutions)
+    ext = rng.choice(formats)
+    corrupt = rng.random() < corrupt_fraction
+    path = os.path.join(directory, f"wall_{index:06d}.{ext}")
+
+    # A random 16x9 tile scaled up gives unique, smooth content that
+    # compresses like a photo rather than like flat colour or pure noise
+    tile = Image.frombytes("RGB", (16, 9), rng.randbytes(16 * 9 * 3))
+    tile.resize((width, height), Image.Resampling.BILINEAR).save(path, FORMATS[ext])
+
+    if corrupt:
+        if rng.random() < 0.5:
+            with open(path, "r+b") as f:
+                f.truncate(os.path.getsize(path) // 3)
+        else:
+            with open(path, "wb") as f:
+                f.write(rng.randbytes(4096))
+    return corrupt
+
+
+def generate_library(directory: str, count: int, resolutions=DEFAULT_RESOLUTIONS,
+                     formats=("jpg", "png", "bmp"), corrupt_fraction: float = 0.02,
+                     seed: int = 0, jobs: int | None = None) -> dict:
+    """
+    Creates a library of count images in directory and returns its manifest.
+
+    The same parameters always produce the same files, so an existing library
+    with a matching manifest is reused instead of being generated again.
+    """
+    params = {
+        "count": count,
+        "resolutions": [list(r) for r in resolutions],
+        "formats": list(formats),
+        "corrupt_fraction": corrupt_fraction,
+        "seed": seed,
+    }
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest["params"] == params:
+            return manifest
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+
+    os.makedirs(directory, exist_ok=True)
+    for entry in os.scandir(directory):
+        if entry.name.startswith("wall_"):
+            os.remove(entry.path)
+
+    jobs_args = [(directory, i, seed, list(resolutions), list(formats), corrupt_fraction) for i in range(count)]
+    with Pool(jobs) as pool:
+        corrupt_count = sum(pool.imap_unordered(_make_image, jobs_args, chunksize=32))
+
+    manifest = {
+        "params": params,
+        "corrupt": corrupt_count,
+        "bytes": sum(e.stat().st_size for e in os.scandir(directory) if e.name.startswith("wall_")),
+    }
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return manifest
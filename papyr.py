@@ -5,6 +5,7 @@ import argparse
 import signal
 import gi
 from papyr import daemon
+from papyr import trace
 
 # We only import GTK if we are not running in a daemon context
 if "--run-daemon-loop" not in sys.argv and "--slideshow" not in sys.argv:
@@ -39,6 +40,26 @@ def main():
         # --- END MODIFIED ---
         help="Control the wallpaper slideshow daemon."
     )
+    parser.add_argument(
+        "--foreground",
+        action="store_true",
+        help="With '--slideshow start', run the daemon in this process (e.g. under a systemd user unit)."
+    )
+    parser.add_argument(
+        "--log-level",
+        metavar="LEVEL",
+        help="Enable logging at the given level (debug, info, warning, ...)."
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="Write a Chrome trace of timing spans to FILE on exit ('%%p' expands to the PID)."
+    )
+    parser.add_argument(
+        "--trace-summary",
+        metavar="FILE",
+        help="Write a JSON summary of timing spans and counters to FILE on exit."
+    )
     parser.add_argument(
         "--run-daemon-loop",
         action="store_true",
@@ -47,11 +68,21 @@ def main():
 
     args = parser.parse_args()
 
+    # Options are passed on through the environment so a daemon started
+    # from this process is instrumented the same way
+    if args.log_level:
+        os.environ[trace.LOG_ENV] = args.log_level
+    if args.trace:
+        os.environ[trace.TRACE_ENV] = args.trace
+    if args.trace_summary:
+        os.environ[trace.SUMMARY_ENV] = args.trace_summary
+    trace.configure()
+
     # --- MODIFIED: Handle new arguments ---
     if args.run_daemon_loop:
         daemon.run_loop()
     elif args.slideshow == "start":
-        daemon.start()
+        daemon.start(foreground=args.foreground)
     elif args.slideshow == "stop":
         daemon.stop()
     elif args.slideshow in ["pause", "resume"]:
@@ -67,7 +98,8 @@ def main():
         # If no arguments are given, run the GUI
         from papyr.main import PapyrApplication
         app = PapyrApplication()
-        sys.exit(app.run(sys.argv))
+        # Options were handled above; GApplication would reject them as unknown
+        sys.exit(app.run(sys.argv[:1]))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
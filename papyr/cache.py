@@ -0,0 +1,213 @@
+import os
+import json
+import logging
+import atexit
+import hashlib
+import threading
+from . import trace
+from . import formats
+
+log = logging.getLogger(__name__)
+
+CACHE_ROOT = os.path.expanduser("~/.cache/papyr")
+INDEX_PATH = os.path.join(CACHE_ROOT, "index.json")
+
+# Only the first and last blocks of a file are hashed. Together with the file
+# size this is enough to tell wallpapers apart without reading them in full.
+FINGERPRINT_BLOCK = 64 * 1024
+
+# Brightness is measured on a tiny reduced copy of the image
+BRIGHTNESS_BOX = (64, 64)
+
+os.makedirs(CACHE_ROOT, exist_ok=True)
+
+_lock = threading.Lock()
+_index = None
+_dirty = False
+
+
+def _load_index() -> dict:
+    """Loads the on-disk index once, returns an empty one if missing or corrupt."""
+    global _index
+    if _index is None:
+        try:
+            with open(INDEX_PATH, 'r') as f:
+                _index = json.load(f)
+        except FileNotFoundError:
+            _index = {}
+        except (ValueError, OSError) as e:
+            log.warning("Ignoring unreadable cache index %s: %s", INDEX_PATH, e)
+            _index = {}
+    return _index
+
+
+def _compute_fingerprint(path: str, size: int) -> str:
+    """Hashes the file size together with its head and tail blocks."""
+    hasher = hashlib.blake2b(str(size).encode('ascii'), digest_size=16)
+    with open(path, 'rb') as f:
+        hasher.update(f.read(FINGERPRINT_BLOCK))
+        if size > 2 * FINGERPRINT_BLOCK:
+            f.seek(-FINGERPRINT_BLOCK, os.SEEK_END)
+            hasher.update(f.read(FINGERPRINT_BLOCK))
+        elif size > FINGERPRINT_BLOCK:
+            hasher.update(f.read())
+    return hasher.hexdigest()
+
+
+def _entry_for(st: os.stat_result) -> dict:
+    """Returns the index entry for a stat result, resetting it if the file changed."""
+    global _dirty
+    index = _load_index()
+    inode_key = f"{st.st_dev}:{st.st_ino}"
+    entry = index.get(inode_key)
+    if not entry or entry["mtime"] != st.st_mtime_ns or entry["size"] != st.st_size:
+        entry = index[inode_key] = {"mtime": st.st_mtime_ns, "size": st.st_size}
+        _dirty = True
+    return entry
+
+
+def get_fingerprint(path: str) -> str:
+    """
+    Returns a content fingerprint for the file at path.
+
+    Results are remembered per inode, so a renamed or moved file is recognised
+    without reading it again as long as its mtime and size are unchanged.
+    """
+    global _dirty
+    st = os.stat(path)
+    with _lock:
+        if key := _entry_for(st).get("key"):
+            trace.count("fingerprint_index_hit")
+            return key
+
+    trace.count("fingerprint_index_miss")
+    key = _compute_fingerprint(path, st.st_size)
+    with _lock:
+        _entry_for(st)["key"] = key
+        _dirty = True
+    return key
+
+
+def set_dimensions(path: str, size: tuple[int, int]):
+    """Records the pixel dimensions of an image that has already been opened."""
+    global _dirty
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    with _lock:
+        entry = _entry_for(st)
+        entry["width"], entry["height"] = size
+        _dirty = True
+
+
+def get_dimensions(path: str) -> tuple[int, int] | None:
+    """
+    Returns the (width, height) of an image, or None if it cannot be read.
+
+    Stored dimensions are used when available; otherwise only the image header
+    is parsed, which is far cheaper than decoding it.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _lock:
+        entry = _entry_for(st)
+        if "width" in entry:
+            return (entry["width"], entry["height"]) if entry["width"] else None
+
+    try:
+        img, size = formats.open_image(path, (1, 1), get_format(path, st))
+        img.close()
+    except Exception as e:
+        log.info("Could not read dimensions of %s: %s", path, e)
+        size = (0, 0) # Recorded so the file is not opened again until it changes
+    set_dimensions(path, size)
+    return size if size[0] else None
+
+
+def set_brightness(path: str, value: float):
+    """Records the mean brightness of an image, from 0 (black) to 1 (white)."""
+    global _dirty
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    with _lock:
+        _entry_for(st)["brightness"] = round(value, 3)
+        _dirty = True
+
+
+def get_brightness(path: str) -> float | None:
+    """
+    Returns the mean brightness of an image, or None if it cannot be read.
+
+    Thumbnailing records it for free; otherwise the image is decoded once at
+    the smallest size its format allows.
+    """
+    global _dirty
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _lock:
+        entry = _entry_for(st)
+        if "brightness" in entry:
+            return entry["brightness"]
+
+    try:
+        with trace.span("measure_brightness"):
+            img, size = formats.open_image(path, BRIGHTNESS_BOX, get_format(path, st))
+            with img:
+                img.thumbnail(BRIGHTNESS_BOX)
+                value = formats.mean_brightness(img)
+    except Exception as e:
+        log.info("Could not measure brightness of %s: %s", path, e)
+        with _lock:
+            _entry_for(st)["brightness"] = None # Not measured again until the file changes
+            _dirty = True
+        return None
+    set_dimensions(path, size)
+    set_brightness(path, value)
+    return round(value, 3)
+
+
+def get_format(path: str, st: os.stat_result | None = None) -> str | None:
+    """
+    Returns the image format of a file as identified by its magic bytes, or
+    None if it is not a recognised image. Results are stored in the index,
+    so each file's header is only read once.
+    """
+    global _dirty
+    if st is None:
+        st = os.stat(path)
+    with _lock:
+        entry = _entry_for(st)
+        if "format" in entry:
+            return entry["format"] or None
+
+    fmt = formats.sniff_format(path)
+    with _lock:
+        _entry_for(st)["format"] = fmt or ""
+        _dirty = True
+    return fmt
+
+
+def save_index():
+    """Writes the index to disk atomically if it has changed."""
+    global _dirty
+    with _lock:
+        if not _dirty:
+            return
+        temp_path = f"{INDEX_PATH}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(_index, f)
+            os.replace(temp_path, INDEX_PATH)
+            _dirty = False
+        except OSError as e:
+            log.error("Error saving cache index %s: %s", INDEX_PATH, e)
+
+
+atexit.register(save_index)
@@ -5,6 +5,7 @@ import tomli
 CONFIG_PATH = os.path.expanduser("~/.config/papyr/config.toml")
 IGNORE_LIST_PATH = os.path.expanduser("~/.config/papyr/ignore.list")
 ORDER_LIST_PATH = os.path.expanduser("~/.config/papyr/order.list")
+FAVORITE_LIST_PATH = os.path.expanduser("~/.config/papyr/favorites.list")
 
 class Config:
     """Manages Papyr's configuration."""
@@ -14,6 +15,11 @@ class Config:
         self.wallpaper_dirs = []
         self.close_on_unfocus = True
         self.slideshow_interval = 10
+        self.slideshow_per_output = False
+        self.slideshow_outputs = {} # Per-output overrides, keyed by output name
+        self.slideshow_history = 50 # Wallpapers remembered for 'prev'
+        self.slideshow_favorite_weight = 3.0 # How much more often favorites are shown
+        self.slideshow_rules = [] # Time-of-day brightness rules
         self.enable_pywal = False
         self.setter = "auto" # Default wallpaper setter
 
@@ -28,6 +34,15 @@ class Config:
                 
                 if 'slideshow' in cfg and isinstance(cfg.get('slideshow'), dict):
                     self.slideshow_interval = cfg['slideshow'].get('interval', self.slideshow_interval)
+                    self.slideshow_per_output = cfg['slideshow'].get('per_output', self.slideshow_per_output)
+                    outputs = cfg['slideshow'].get('outputs', {})
+                    if isinstance(outputs, dict):
+                        self.slideshow_outputs = {name: opts for name, opts in outputs.items() if isinstance(opts, dict)}
+                    self.slideshow_history = cfg['slideshow'].get('history', self.slideshow_history)
+                    self.slideshow_favorite_weight = cfg['slideshow'].get('favorite_weight', self.slideshow_favorite_weight)
+                    rules = cfg['slideshow'].get('rules', [])
+                    if isinstance(rules, list):
+                        self.slideshow_rules = [rule for rule in rules if isinstance(rule, dict)]
 
                 if 'features' in cfg and isinstance(cfg.get('features'), dict):
                     self.enable_pywal = cfg['features'].get('enable_pywal', self.enable_pywal)
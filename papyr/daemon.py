@@ -1,75 +1,218 @@
 import os
 import sys
+import fcntl
+import atexit
+import socket
 import time
 import signal
-import random
+import select
 import subprocess
+import logging
 import psutil
-from .config import Config, IGNORE_LIST_PATH, ORDER_LIST_PATH
-from .setter import set_wallpaper
+from array import array
+from .config import Config, CONFIG_PATH, IGNORE_LIST_PATH, ORDER_LIST_PATH, FAVORITE_LIST_PATH
+from . import cache
+from . import setter
+from .model import Catalog
+from .scheduler import Scheduler, parse_rules
+from .setter import set_wallpaper, set_wallpapers
+from .watcher import FileWatcher
+
+log = logging.getLogger(__name__)
 
 PID_FILE = os.path.expanduser("~/.cache/papyr/daemon.pid")
+LOCK_FILE = os.path.expanduser("~/.cache/papyr/daemon.lock")
+
+# Command-line flags that identify a process as the daemon
+DAEMON_FLAGS = {"--run-daemon-loop", "--foreground"}
+READY_TIMEOUT = 30 # Seconds 'start' waits for the first directory scan
+STOP_TIMEOUT = 5 # Seconds 'stop' waits before killing the daemon
 
 # --- NEW: Global state variables for signal handlers ---
 is_paused = False
 force_next_wallpaper = False
+force_prev_wallpaper = False
 # --- END NEW ---
 
-def get_pid():
-    """Reads the PID from the PID file, returns None if not found or invalid."""
-    if not os.path.exists(PID_FILE):
+_wakeup_read_fd = None
+_lock_fd = None # Held open for the daemon's lifetime
+
+def _acquire_lock() -> int | None:
+    """
+    Takes the single-instance lock, returns its fd or None if another daemon
+    holds it. The kernel releases it when the process exits, even on a crash.
+    """
+    fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
         return None
+    return fd
+
+def _lock_is_held() -> bool:
+    try:
+        fd = os.open(LOCK_FILE, os.O_RDONLY | os.O_CLOEXEC)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        return False
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+
+def _write_pid_file():
+    """Records this process's PID and start time, so a reused PID is never mistaken for it."""
+    process = psutil.Process()
+    temp_path = f"{PID_FILE}.{process.pid}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(f"{process.pid} {process.create_time()}\n")
+    os.replace(temp_path, PID_FILE)
+    atexit.register(_remove_pid_file, process.pid)
+
+def _remove_pid_file(pid: int):
+    """Removes the PID file if it still belongs to pid."""
+    try:
+        with open(PID_FILE, 'r') as f:
+            if int(f.read().split()[0]) == pid:
+                os.remove(PID_FILE)
+    except (ValueError, IndexError, OSError):
+        pass
+
+def _daemon_process() -> psutil.Process | None:
+    """Returns the running daemon, checking that the PID file still names the process that wrote it."""
     try:
         with open(PID_FILE, 'r') as f:
-            pid = int(f.read().strip())
-        if psutil.pid_exists(pid):
-            return pid
-        else:
-            # The process is gone, clean up the stale PID file
-            os.remove(PID_FILE)
-            return None
-    except (ValueError, FileNotFoundError):
+            fields = f.read().split()
+        pid = int(fields[0])
+        create_time = float(fields[1]) if len(fields) > 1 else None
+    except (ValueError, IndexError, OSError):
         return None
 
-def start():
-    """Starts the slideshow daemon in the background."""
-    if get_pid():
-        print("Slideshow daemon is already running.")
+    try:
+        process = psutil.Process(pid)
+        if create_time is not None and abs(process.create_time() - create_time) > 0.01:
+            raise psutil.NoSuchProcess(pid)
+        if not DAEMON_FLAGS & set(process.cmdline()):
+            raise psutil.NoSuchProcess(pid)
+        return process
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        # Only a file left behind by a crash is cleaned up, never that of a daemon still starting
+        if not _lock_is_held():
+            _remove_pid_file(pid)
+        return None
+
+def get_pid():
+    """Returns the PID of the running daemon, or None if it is not running."""
+    process = _daemon_process()
+    return process.pid if process else None
+
+def _notify_ready():
+    """
+    Reports that the daemon is up, sd_notify style, to systemd or to the
+    'start' command waiting for it. Does nothing if neither is listening.
+    """
+    # Removed from the environment so that setters do not inherit it
+    address = os.environ.pop("NOTIFY_SOCKET", None)
+    if not address:
+        return
+    if address.startswith("@"):
+        address = "\0" + address[1:] # Abstract socket namespace
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as sock:
+            sock.sendto(f"READY=1\nMAINPID={os.getpid()}".encode(), address)
+    except OSError as e:
+        log.warning("Could not send readiness notification: %s", e)
+
+def _wait_until_ready(sock: socket.socket, process: subprocess.Popen, timeout: float) -> bool:
+    """Waits for READY=1 on sock. Returns False if the process exits or the timeout expires first."""
+    deadline = time.monotonic() + timeout
+    while (remaining := deadline - time.monotonic()) > 0:
+        # Wake up regularly to notice a daemon that exits without reporting
+        readable, _, _ = select.select([sock], [], [], min(remaining, 0.1))
+        if readable and b"READY=1" in sock.recv(4096).split(b"\n"):
+            return True
+        if process.poll() is not None:
+            return False
+    return False
+
+def start(foreground: bool = False):
+    """
+    Starts the slideshow daemon in the background and waits until it is
+    running. With foreground, runs it in this process instead, e.g. under a
+    systemd user unit.
+    """
+    if pid := get_pid():
+        print(f"Slideshow daemon is already running (PID {pid}).")
+        return
+
+    if foreground:
+        run_loop()
         return
 
     config = Config()
-    
+
     # Launch this same script as a new detached process
     # with the argument '--run-daemon-loop'
     executable = sys.executable
     script_path = os.path.abspath(sys.argv[0])
-    
-    process = subprocess.Popen(
-        [executable, script_path, "--run-daemon-loop"],
-        start_new_session=True # This detaches it from our current terminal
-    )
 
-    with open(PID_FILE, 'w') as f:
-        f.write(str(process.pid))
+    # The daemon reports readiness on this socket the way it would to systemd
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as sock:
+        address = f"papyr-{os.getpid()}-{os.urandom(4).hex()}"
+        sock.bind("\0" + address)
+        process = subprocess.Popen(
+            [executable, script_path, "--run-daemon-loop"],
+            start_new_session=True, # This detaches it from our current terminal
+            env=dict(os.environ, NOTIFY_SOCKET="@" + address),
+        )
+        ready = _wait_until_ready(sock, process, READY_TIMEOUT)
 
-    print(f"Slideshow daemon started with interval of {config.slideshow_interval} minutes.")
+    if ready:
+        print(f"Slideshow daemon started with interval of {config.slideshow_interval} minutes.")
+    elif process.poll() is None:
+        print(f"Slideshow daemon is still starting (PID {process.pid}).")
+    elif pid := get_pid():
+        # Another 'start' won the race for the lock
+        print(f"Slideshow daemon is already running (PID {pid}).")
+    else:
+        print("Slideshow daemon exited during startup. Run it with '--log-level info' to see why.")
+
+def _wait_for_exit(process: psutil.Process, timeout: float) -> bool:
+    """
+    Waits for a process to exit, returns False on timeout. A zombie counts as
+    exited, since reaping it is up to its parent (usually init).
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        while process.status() != psutil.STATUS_ZOMBIE:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+    except psutil.NoSuchProcess:
+        pass
+    return True
 
 def stop():
-    """Stops the running slideshow daemon."""
-    pid = get_pid()
-    if not pid:
+    """Stops the running slideshow daemon and waits for it to exit."""
+    process = _daemon_process()
+    if not process:
         print("Slideshow daemon is not running.")
         return
 
     try:
-        process = psutil.Process(pid)
         process.terminate() # Ask it to shut down gracefully
+        if not _wait_for_exit(process, STOP_TIMEOUT):
+            print(f"Slideshow daemon did not exit within {STOP_TIMEOUT}s. Killing it.")
+            process.kill()
+            _wait_for_exit(process, STOP_TIMEOUT)
         print("Slideshow daemon stopped.")
     except psutil.NoSuchProcess:
-        print("Slideshow daemon was not running (stale PID file cleaned).")
+        print("Slideshow daemon had already exited.")
     finally:
-        if os.path.exists(PID_FILE):
-            os.remove(PID_FILE)
+        _remove_pid_file(process.pid)
 
 # --- NEW: Signal handler functions ---
 def handle_sig_pause_resume(signum, frame):
@@ -77,15 +220,15 @@ def handle_sig_pause_resume(signum, frame):
     global is_paused
     is_paused = not is_paused
     if is_paused:
-        print("Daemon: Paused.")
+        log.info("Paused.")
     else:
-        print("Daemon: Resumed.")
+        log.info("Resumed.")
 
 def handle_sig_next(signum, frame):
     """Forces the next wallpaper to be set."""
     global force_next_wallpaper
     force_next_wallpaper = True
-    print("Daemon: Skipping to next wallpaper.")
+    log.info("Skipping to next wallpaper.")
 
 def handle_sig_prev(signum, frame):
     """Forces the previous wallpaper to be set."""
@@ -93,90 +236,205 @@ def handle_sig_prev(signum, frame):
     # We'll use a global flag similar to the 'next' handler.
     global force_prev_wallpaper
     force_prev_wallpaper = True
-    print("Daemon: Skipping to previous wallpaper.")
+    log.info("Skipping to previous wallpaper.")
+
+def handle_sig_term(signum, frame):
+    """Exits through the normal interpreter shutdown so exit hooks still run."""
+    sys.exit(0)
 # --- END NEW ---
 
+def _matches_orientation(catalog: Catalog, item_id: int, orientation: str) -> bool:
+    """Checks an image against 'portrait' or 'landscape' using its stored dimensions."""
+    size = catalog.dimensions(item_id)
+    if not size:
+        return True
+    return (size[1] > size[0]) == (orientation == "portrait")
+
+
+def _scheduler_settings(config: Config, output: str | None, use_random_shuffle: bool) -> tuple:
+    """Returns the Scheduler settings for an output, or for all outputs if it is None."""
+    opts = config.slideshow_outputs.get(output, {}) if output else {}
+    return (
+        opts.get("interval", config.slideshow_interval) * 60,
+        opts.get("shuffle", use_random_shuffle),
+        config.slideshow_history,
+        config.slideshow_favorite_weight,
+        parse_rules(config.slideshow_rules),
+    )
+
+
+def _ids_for_output(config: Config, catalog: Catalog, ids: array, name: str, size: tuple | None) -> array:
+    """Filters ids down to the wallpapers whose orientation suits an output."""
+    orientation = config.slideshow_outputs.get(name, {}).get("orientation", "auto")
+    if orientation == "auto":
+        orientation = ("portrait" if size[1] > size[0] else "landscape") if size else "any"
+
+    output_ids = ids
+    if orientation in ("portrait", "landscape"):
+        output_ids = array('I', (i for i in ids if _matches_orientation(catalog, i, orientation)))
+        if not output_ids:
+            log.warning("No %s wallpapers for %s. Using all of them.", orientation, name)
+            output_ids = ids
+    log.info("Output %s has %d wallpapers (%s).", name, len(output_ids), orientation)
+    return output_ids
+
+
+def _build_schedulers(config: Config, catalog: Catalog, ids: array, outputs: dict, use_random_shuffle: bool) -> dict:
+    """Creates one scheduler per output, or a single one keyed by None."""
+    if not outputs:
+        return {None: Scheduler(catalog, ids, *_scheduler_settings(config, None, use_random_shuffle))}
+
+    schedulers = {}
+    for name, size in outputs.items():
+        output_ids = _ids_for_output(config, catalog, ids, name, size)
+        schedulers[name] = Scheduler(catalog, output_ids, *_scheduler_settings(config, name, use_random_shuffle))
+
+    # Dimensions read while filtering are worth keeping for the next start
+    cache.save_index()
+    return schedulers
+
+
+def _playable_ids(catalog: Catalog) -> array:
+    """With a custom order only the listed wallpapers are played, in that order."""
+    return catalog.view(listed_only=catalog.has_custom_order)
+
+
+def _reload(changed: set[str], config: Config, catalog: Catalog, schedulers: dict, outputs: dict) -> Config:
+    """
+    Applies edits to the config file and the lists to the running slideshow.
+    Directories are not rescanned, and each scheduler keeps its history.
+    """
+    log.info("Reloading %s.", ", ".join(sorted(os.path.basename(p) for p in changed)))
+    if CONFIG_PATH in changed:
+        new_config = Config()
+        if new_config.wallpaper_dirs != config.wallpaper_dirs:
+            log.info("Wallpaper directories changed. They will be scanned on the next start.")
+        if new_config.slideshow_per_output != config.slideshow_per_output:
+            log.info("per_output changed. Restart the slideshow to apply it.")
+        config = new_config
+    if changed - {CONFIG_PATH}:
+        was_ordered = catalog.has_custom_order
+        catalog.reload_lists()
+        if was_ordered and not catalog.has_custom_order and not catalog.scanned:
+            log.info("Order list removed. Only the wallpapers it listed are shuffled "
+                     "until a restart scans the directories.")
+
+    use_random_shuffle = not catalog.has_custom_order
+    for name, scheduler in schedulers.items():
+        scheduler.configure(*_scheduler_settings(config, name, use_random_shuffle))
+
+    ids = _playable_ids(catalog)
+    if not ids:
+        log.warning("No wallpapers left to show. Keeping the current ones.")
+        return config
+    for name, scheduler in schedulers.items():
+        scheduler.set_ids(_ids_for_output(config, catalog, ids, name, outputs[name]) if name else ids)
+    cache.save_index()
+    return config
+
+
+def _wait_for_wakeup(timeout: float | None, watcher: FileWatcher):
+    """Sleeps until the timeout expires, a control signal arrives or a watched file changes."""
+    fds = [_wakeup_read_fd]
+    if watcher.fileno() is not None:
+        fds.append(watcher.fileno())
+    try:
+        select.select(fds, [], [], timeout)
+    except InterruptedError:
+        pass
+    # Drain the signal numbers written by the C-level handler
+    try:
+        while os.read(_wakeup_read_fd, 512):
+            pass
+    except BlockingIOError:
+        pass
+
+
 def run_loop():
     """The main loop for the daemon process."""
-    # --- NEW: Register signal handlers ---
+    global force_next_wallpaper
+    global force_prev_wallpaper
+    global _wakeup_read_fd
+    global _lock_fd
+    force_prev_wallpaper = False
+
+    _lock_fd = _acquire_lock()
+    if _lock_fd is None:
+        log.warning("Another slideshow daemon is already running. Exiting.")
+        return
+    _write_pid_file()
+
+    # Signals are delivered through a pipe so the loop can sleep until the
+    # next change is due instead of polling every second
+    _wakeup_read_fd, wakeup_write_fd = os.pipe()
+    os.set_blocking(_wakeup_read_fd, False)
+    os.set_blocking(wakeup_write_fd, False)
+    signal.set_wakeup_fd(wakeup_write_fd)
+
     signal.signal(signal.SIGUSR1, handle_sig_pause_resume)
     signal.signal(signal.SIGUSR2, handle_sig_next)
     # Using SIGHUP for 'prev' as a distinct signal
     signal.signal(signal.SIGHUP, handle_sig_prev)
-    global force_next_wallpaper
-    global force_prev_wallpaper # Add this global
-    force_prev_wallpaper = False
-    # --- END NEW ---
+    signal.signal(signal.SIGTERM, handle_sig_term)
 
+    # Watch before loading so that edits made during the scan are not missed
+    watcher = FileWatcher([CONFIG_PATH, IGNORE_LIST_PATH, ORDER_LIST_PATH, FAVORITE_LIST_PATH])
     config = Config()
-    
-    try:
-        with open(IGNORE_LIST_PATH, 'r') as f:
-            ignore_list = set(line.strip() for line in f)
-    except FileNotFoundError:
-        ignore_list = set()
-
-    wallpaper_list = []
-    use_random_shuffle = True
-    
-    if os.path.exists(ORDER_LIST_PATH):
-        print("Daemon: Custom order list found. Using it.")
-        with open(ORDER_LIST_PATH, 'r') as f:
-            wallpaper_list = [line.strip() for line in f if line.strip() not in ignore_list]
-        use_random_shuffle = False
-    else:
-        print("Daemon: No order list found. Scanning directories.")
-        VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
-        all_images = []
-        for directory in config.wallpaper_dirs:
-            for entry in os.scandir(directory):
-                path = entry.path
-                if entry.is_file() and os.path.splitext(path)[1].lower() in VALID_EXTENSIONS:
-                    if path not in ignore_list:
-                        all_images.append(path)
-        wallpaper_list = all_images
-
-    if not wallpaper_list:
-        print("Daemon: No valid wallpapers found. Exiting.")
-        return
 
+    use_random_shuffle = not os.path.exists(ORDER_LIST_PATH)
     if use_random_shuffle:
-        random.shuffle(wallpaper_list)
+        log.info("No order list found. Scanning directories.")
+    else:
+        log.info("Custom order list found. Using it.")
+    catalog = Catalog.load(config, scan=use_random_shuffle)
+    ids = _playable_ids(catalog)
+
+    if not ids:
+        log.warning("No valid wallpapers found. Exiting.")
+        return
 
-    interval_seconds = config.slideshow_interval * 60
-    current_index = 0
+    outputs = setter.detect_outputs() if config.slideshow_per_output else {}
+    schedulers = _build_schedulers(config, catalog, ids, outputs, use_random_shuffle)
+    current = {}
+    _notify_ready()
 
     while True:
-        # --- MODIFIED: Main loop logic for responsiveness ---
-        while is_paused:
-            time.sleep(1) # Wait efficiently while paused
+        now = time.monotonic()
+        changed = False
 
+        # next/prev take effect immediately, even while paused
         if force_prev_wallpaper:
-            current_index -= 2 # Move back two positions
-            if current_index < -1:
-                current_index = len(wallpaper_list) - 2
-            force_prev_wallpaper = False
-
-        if current_index >= len(wallpaper_list):
-            current_index = 0
-            if use_random_shuffle:
-                random.shuffle(wallpaper_list)
-        
-        if current_index < 0:
-            current_index = len(wallpaper_list) -1
-
-
-        wallpaper = wallpaper_list[current_index]
-        set_wallpaper(wallpaper, config)
-        current_index += 1
-        
-        # Wait for the interval, but check for signals every second
-        for _ in range(interval_seconds):
-            if force_next_wallpaper or force_prev_wallpaper or is_paused:
-                break # Exit sleep loop immediately
-            time.sleep(1)
-        
-        if force_next_wallpaper:
-            force_next_wallpaper = False
-            continue # Skip to the next iteration
-        # --- END MODIFIED ---
\ No newline at end of file
+            for output, scheduler in schedulers.items():
+                if (item_id := scheduler.prev()) is not None:
+                    current[output] = item_id
+                    changed = True
+                scheduler.due = now + scheduler.interval
+        forced = force_next_wallpaper
+        if forced:
+            for scheduler in schedulers.values():
+                scheduler.due = now
+        force_next_wallpaper = force_prev_wallpaper = False
+
+        if forced or not is_paused:
+            for output, scheduler in schedulers.items():
+                if scheduler.due <= now:
+                    current[output] = scheduler.next()
+                    scheduler.due = now + scheduler.interval
+                    changed = True
+
+        if changed:
+            # All outputs are applied together in one setter invocation
+            if None in current:
+                set_wallpaper(catalog.path(current[None]), config)
+            else:
+                set_wallpapers({output: catalog.path(i) for output, i in current.items()}, config)
+            # Keep brightness measured while picking for the next start
+            cache.save_index()
+
+        timeout = None if is_paused else max(0.0, min(s.due for s in schedulers.values()) - time.monotonic())
+        if watcher.poll_interval is not None:
+            timeout = watcher.poll_interval if timeout is None else min(timeout, watcher.poll_interval)
+        _wait_for_wakeup(timeout, watcher)
+
+        if changed_files := watcher.changed():
+            config = _reload(changed_files, config, catalog, schedulers, outputs)
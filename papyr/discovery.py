@@ -0,0 +1,39 @@
+import os
+import logging
+from . import cache
+from . import formats
+from . import trace
+
+log = logging.getLogger(__name__)
+
+
+def scan_images(directories: list[str]) -> dict[str, int]:
+    """
+    Maps the path of every image directly inside the given directories to its mtime in nanoseconds.
+
+    Files are recognised by their magic bytes rather than their extension, and
+    only formats with an available decoder are included.
+    """
+    found_images = {}
+    with trace.span("discover"):
+        for directory in directories:
+            try:
+                for entry in os.scandir(directory):
+                    if not entry.is_file():
+                        continue
+                    try:
+                        st = entry.stat()
+                        fmt = cache.get_format(entry.path, st)
+                    except OSError as e:
+                        log.warning("Cannot read %s: %s", entry.path, e)
+                        continue
+                    if fmt and formats.is_supported(fmt):
+                        found_images[entry.path] = st.st_mtime_ns
+            except OSError as e:
+                log.error("Cannot scan %s: %s", directory, e)
+    return found_images
+
+
+def discover_images(directories: list[str]) -> list[str]:
+    """Returns the sorted paths of all images directly inside the given directories."""
+    return sorted(scan_images(directories))
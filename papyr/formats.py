@@ -0,0 +1,191 @@
+import logging
+import functools
+import importlib
+
+log = logging.getLogger(__name__)
+
+# Enough of the header to identify every supported format, including the
+# compatible-brand list of an ISO-BMFF 'ftyp' box (AVIF, HEIC)
+HEADER_SIZE = 64
+
+AVIF_BRANDS = {b"avif", b"avis"}
+HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"hevm", b"hevs"}
+
+
+def _ftyp_brands(header: bytes) -> set[bytes]:
+    """Returns the major and compatible brands of a leading ISO-BMFF 'ftyp' box."""
+    if header[4:8] != b"ftyp":
+        return set()
+    box_size = min(int.from_bytes(header[0:4], "big"), len(header))
+    brands = {header[8:12]}
+    brands.update(header[i:i + 4] for i in range(16, box_size - 3, 4))
+    return brands
+
+
+# Sizes of the DIB headers that follow a BMP file header, one per format version
+BMP_DIB_SIZES = {12, 40, 52, 56, 64, 108, 124}
+
+
+def _is_bmp(header: bytes) -> bool:
+    """'BM' alone matches plenty of text files, so the DIB header size is checked too."""
+    return header.startswith(b"BM") and int.from_bytes(header[14:18], "little") in BMP_DIB_SIZES
+
+
+def target_size(size: tuple[int, int], box: tuple[int, int]) -> tuple[int, int]:
+    """Returns the aspect-preserving size an image of the given size is reduced to within box."""
+    scale = min(box[0] / size[0], box[1] / size[1], 1)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def mean_brightness(img) -> float:
+    """Returns the mean luma of an image, from 0 (black) to 1 (white)."""
+    from PIL import ImageStat
+    return ImageStat.Stat(img.convert("L")).mean[0] / 255
+
+
+# --- Decoders ---
+# An opener takes a path and the thumbnail box and returns the opened (not yet
+# loaded) image together with the original (width, height). Openers should
+# use the cheapest reduced-size decode the format offers, and must not seek
+# past the first frame of animated files.
+
+def _open_default(path: str, box: tuple[int, int], pil_formats=None):
+    from PIL import Image
+    img = Image.open(path, formats=pil_formats)
+    return img, img.size
+
+
+def _open_jpeg(path: str, box: tuple[int, int]):
+    from PIL import Image
+    img = Image.open(path, formats=["JPEG"])
+    original_size = img.size
+    # libjpeg can decode straight to 1/2, 1/4 or 1/8 scale. Ask for twice the
+    # final size, as Image.thumbnail() would, to keep resampling quality
+    width, height = target_size(original_size, box)
+    img.draft(None, (width * 2, height * 2))
+    return img, original_size
+
+
+def _open_heif(path: str, box: tuple[int, int]):
+    from PIL import Image
+    img = Image.open(path)
+    original_size = img.size
+    try:
+        # Most cameras and encoders embed small previews; use one if it is big enough
+        from pillow_heif import thumbnail
+        img = thumbnail(img, min_box=max(box))
+    except Exception: # pillow_heif missing, too old, or the image came from another plugin
+        pass
+    return img, original_size
+
+
+def _open_builtin(pil_format: str):
+    return lambda path, box: _open_default(path, box, [pil_format])
+
+
+# --- Plugin availability ---
+
+def _pillow_has(module: str) -> bool:
+    from PIL import features
+    try:
+        return features.check_module(module)
+    except ValueError: # Older Pillow that does not know the module at all
+        return False
+
+
+def _enable_heif_plugin() -> bool:
+    try:
+        import pillow_heif
+    except ImportError:
+        return False
+    pillow_heif.register_heif_opener()
+    return True
+
+
+def _enable_avif() -> bool:
+    if _pillow_has("avif"):
+        return True
+    try:
+        importlib.import_module("pillow_avif") # Registers itself with Pillow on import
+        return True
+    except ImportError:
+        pass
+    try:
+        import pillow_heif
+        pillow_heif.register_avif_opener()
+        return True
+    except (ImportError, AttributeError):
+        return False
+
+
+def _enable_jxl() -> bool:
+    try:
+        importlib.import_module("pillow_jxl") # Registers itself with Pillow on import
+        return True
+    except ImportError:
+        return False
+
+
+# name -> (header test, opener, enable function or None if always available)
+FORMATS = {}
+
+
+@functools.cache
+def is_supported(name: str) -> bool:
+    """Returns True if images of the named format can be decoded here."""
+    if name not in FORMATS:
+        return False
+    enable = FORMATS[name][2]
+    if enable is None:
+        return True
+    supported = enable()
+    if not supported:
+        log.info("No decoder available for %s images; they will be skipped.", name)
+    return supported
+
+
+def register_format(name: str, matches, opener=_open_default, enable=None):
+    """
+    Adds support for an image format.
+
+    matches is called with the first HEADER_SIZE bytes of a file. enable, if
+    given, is called once before the format is first used and returns False
+    when the decoder it needs is not installed.
+    """
+    FORMATS[name] = (matches, opener, enable)
+    is_supported.cache_clear()
+
+
+register_format("jpeg", lambda h: h.startswith(b"\xff\xd8\xff"), _open_jpeg)
+register_format("png", lambda h: h.startswith(b"\x89PNG\r\n\x1a\n"), _open_builtin("PNG"))
+register_format("bmp", _is_bmp, _open_builtin("BMP"))
+register_format("gif", lambda h: h[:6] in (b"GIF87a", b"GIF89a"), _open_builtin("GIF"))
+register_format("webp", lambda h: h[:4] == b"RIFF" and h[8:12] == b"WEBP", _open_builtin("WEBP"),
+                lambda: _pillow_has("webp"))
+register_format("avif", lambda h: bool(_ftyp_brands(h) & AVIF_BRANDS), _open_heif, _enable_avif)
+register_format("heic", lambda h: bool(_ftyp_brands(h) & HEIF_BRANDS), _open_heif, _enable_heif_plugin)
+register_format("jxl", lambda h: h.startswith(b"\xff\x0a") or h.startswith(b"\x00\x00\x00\x0cJXL \r\n\x87\n"),
+                _open_default, _enable_jxl)
+
+
+def sniff_format(path: str) -> str | None:
+    """Identifies an image format from the file's magic bytes, not its extension."""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    for name, (matches, _, _) in FORMATS.items():
+        if matches(header):
+            return name
+    return None
+
+
+def open_image(path: str, box: tuple[int, int], fmt: str | None = None):
+    """
+    Opens an image for reduction to fit box, using its format's fastest decode path.
+
+    Returns the image, which may already be smaller than the original, and the
+    original (width, height). Only the first frame of animated images is decoded.
+    """
+    fmt = fmt or sniff_format(path)
+    if fmt in FORMATS and is_supported(fmt):
+        return FORMATS[fmt][1](path, box)
+    return _open_default(path, box)
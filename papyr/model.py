@@ -0,0 +1,209 @@
+import os
+import logging
+from array import array
+from .config import Config, IGNORE_LIST_PATH, ORDER_LIST_PATH, FAVORITE_LIST_PATH
+from . import cache
+from .discovery import scan_images
+
+log = logging.getLogger(__name__)
+
+FLAG_IGNORED = 1
+FLAG_FAVORITE = 2
+FLAG_LISTED = 4 # In the order list
+
+
+def read_list(path: str) -> list[str]:
+    """Reads a list file with one path per line, returns [] if it does not exist."""
+    try:
+        with open(path, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def write_list(path: str, items):
+    """Writes a list file atomically, so readers never see a partial list."""
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, 'w') as f:
+            f.write('\n'.join(items) + '\n')
+        os.replace(temp_path, path)
+    except IOError as e:
+        log.error("Could not save to %s: %s", path, e)
+
+
+class Wallpaper:
+    """A single wallpaper. Slots keep records small on very large libraries."""
+
+    __slots__ = ("id", "path", "mtime", "width", "height", "brightness", "flags")
+
+    def __init__(self, id: int, path: str, mtime: int = 0):
+        self.id = id
+        self.path = path
+        self.mtime = mtime
+        self.width = 0 # Filled in on demand by Catalog.dimensions()
+        self.height = 0
+        self.brightness = -1.0 # Unmeasured; None once found unreadable
+        self.flags = 0
+
+
+class Catalog:
+    """
+    All known wallpapers, each addressed by a small integer id.
+
+    Views are arrays of ids in display order, so filtering and reordering
+    never copy paths around.
+    """
+
+    def __init__(self):
+        self.items: list[Wallpaper] = []
+        self.order = array('I') # All ids in display order
+        self.has_custom_order = False
+        self.scanned = False # Whether the wallpaper directories were searched
+        self._ids: dict[str, int] = {}
+        # Listed paths that are not in the catalog, kept so saving does not drop them
+        self._unknown_ignored: set[str] = set()
+        self._unknown_favorites: set[str] = set()
+
+    @classmethod
+    def load(cls, config: Config, scan: bool = True) -> "Catalog":
+        """
+        Builds the catalog from the order, ignore and favorite lists.
+
+        With scan, the wallpaper directories are searched and any images
+        missing from the order list follow it in name order. Without it, only
+        the order list is used.
+        """
+        catalog = cls()
+        order_list = read_list(ORDER_LIST_PATH)
+        catalog.has_custom_order = os.path.exists(ORDER_LIST_PATH)
+
+        catalog.scanned = scan
+        if scan:
+            found = scan_images(config.wallpaper_dirs)
+            for path in order_list:
+                if path in found:
+                    catalog.add(path, found[path])
+            for path in sorted(found):
+                catalog.add(path, found[path])
+        else:
+            for path in order_list:
+                catalog.add(path)
+
+        catalog._set_listed(i for path in order_list if (i := catalog.id_for(path)) is not None)
+        catalog._apply_list(IGNORE_LIST_PATH, FLAG_IGNORED, catalog._unknown_ignored)
+        catalog._apply_list(FAVORITE_LIST_PATH, FLAG_FAVORITE, catalog._unknown_favorites)
+        return catalog
+
+    def reload_lists(self):
+        """
+        Re-reads the order, ignore and favorite lists after they changed on disk.
+
+        Directories are not scanned again; listed paths new to the catalog are
+        added if they exist.
+        """
+        self.has_custom_order = os.path.exists(ORDER_LIST_PATH)
+        listed = array('I')
+        for path in read_list(ORDER_LIST_PATH):
+            item_id = self._ids.get(path)
+            if item_id is None and os.path.exists(path):
+                item_id = self.add(path)
+            if item_id is not None:
+                listed.append(item_id)
+        self.reorder(listed)
+        self._set_listed(listed)
+        self._apply_list(IGNORE_LIST_PATH, FLAG_IGNORED, self._unknown_ignored)
+        self._apply_list(FAVORITE_LIST_PATH, FLAG_FAVORITE, self._unknown_favorites)
+
+    def _set_listed(self, ids):
+        for item in self.items:
+            item.flags &= ~FLAG_LISTED
+        for item_id in ids:
+            self.items[item_id].flags |= FLAG_LISTED
+
+    def _apply_list(self, list_path: str, flag: int, unknown: set[str]):
+        """Sets flag on exactly the listed wallpapers, keeping unknown paths in unknown."""
+        for item in self.items:
+            item.flags &= ~flag
+        unknown.clear()
+        for path in read_list(list_path):
+            item_id = self._ids.get(path)
+            if item_id is None:
+                unknown.add(path)
+            else:
+                self.items[item_id].flags |= flag
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, item_id: int) -> Wallpaper:
+        return self.items[item_id]
+
+    def add(self, path: str, mtime: int = 0) -> int:
+        """Adds a wallpaper at the end of the display order, returns its id."""
+        item_id = self._ids.get(path)
+        if item_id is None:
+            item_id = len(self.items)
+            self.items.append(Wallpaper(item_id, path, mtime))
+            self._ids[path] = item_id
+            self.order.append(item_id)
+        return item_id
+
+    def id_for(self, path: str) -> int | None:
+        return self._ids.get(path)
+
+    def path(self, item_id: int) -> str:
+        return self.items[item_id].path
+
+    def has_flag(self, item_id: int, flag: int) -> bool:
+        return bool(self.items[item_id].flags & flag)
+
+    def set_flag(self, item_id: int, flag: int, value: bool):
+        if value:
+            self.items[item_id].flags |= flag
+        else:
+            self.items[item_id].flags &= ~flag
+
+    def view(self, ignored: bool = False, listed_only: bool = False) -> array:
+        """
+        Returns the ids of the ignored (or not ignored) wallpapers in display
+        order, optionally only those in the order list.
+        """
+        items = self.items
+        return array('I', (i for i in self.order if bool(items[i].flags & FLAG_IGNORED) == ignored
+                           and (not listed_only or items[i].flags & FLAG_LISTED)))
+
+    def reorder(self, ids):
+        """Moves the given ids to the front of the display order, in the order given."""
+        moved = set(ids)
+        self.order = array('I', ids) + array('I', (i for i in self.order if i not in moved))
+
+    def dimensions(self, item_id: int) -> tuple[int, int] | None:
+        """Returns (width, height), reading it from the cache index on first use."""
+        item = self.items[item_id]
+        if not item.width:
+            size = cache.get_dimensions(item.path)
+            if not size:
+                return None
+            item.width, item.height = size
+        return item.width, item.height
+
+    def brightness(self, item_id: int) -> float | None:
+        """Returns the mean brightness from 0 (black) to 1 (white), measuring it on first use."""
+        item = self.items[item_id]
+        if item.brightness == -1.0:
+            item.brightness = cache.get_brightness(item.path)
+        return item.brightness
+
+    def save_ignore_list(self):
+        paths = [item.path for item in self.items if item.flags & FLAG_IGNORED]
+        write_list(IGNORE_LIST_PATH, paths + sorted(self._unknown_ignored))
+
+    def save_favorite_list(self):
+        paths = [item.path for item in self.items if item.flags & FLAG_FAVORITE]
+        write_list(FAVORITE_LIST_PATH, paths + sorted(self._unknown_favorites))
+
+    def save_order_list(self):
+        """Saves the display order of the wallpapers that are not ignored."""
+        write_list(ORDER_LIST_PATH, [self.items[i].path for i in self.view()])
+        self.has_custom_order = True
@@ -0,0 +1,229 @@
+import time
+import random
+import logging
+from array import array
+from collections import deque
+from .model import Catalog, FLAG_FAVORITE
+
+log = logging.getLogger(__name__)
+
+# Candidates looked at per pick before settling for the best one seen. This
+# keeps every tick constant time, however large the library is.
+MAX_ATTEMPTS = 8
+
+
+def _parse_time(value: str) -> int:
+    """Converts 'HH:MM' to minutes since midnight."""
+    hours, minutes = value.split(":")
+    minute = int(hours) * 60 + int(minutes)
+    if not 0 <= minute < 24 * 60:
+        raise ValueError(f"invalid time of day '{value}'")
+    return minute
+
+
+class Rule:
+    """A brightness range that wallpapers must fall in between two times of day."""
+
+    def __init__(self, start: int, end: int, min_brightness: float = 0.0, max_brightness: float = 1.0):
+        self.start = start
+        self.end = end
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        # Ids found to pass, used when random candidates keep failing
+        self.matches = array('I')
+        self._matched = set()
+
+    @classmethod
+    def from_config(cls, opts: dict) -> "Rule":
+        return cls(
+            _parse_time(opts["from"]),
+            _parse_time(opts["to"]),
+            float(opts.get("min_brightness", 0.0)),
+            float(opts.get("max_brightness", 1.0)),
+        )
+
+    def is_active(self, minute: int) -> bool:
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end # Spans midnight
+
+    def accepts(self, item_id: int, brightness: float | None) -> bool:
+        if brightness is None: # Unreadable images are not held back by rules
+            return True
+        if not self.min_brightness <= brightness <= self.max_brightness:
+            return False
+        if item_id not in self._matched:
+            self._matched.add(item_id)
+            self.matches.append(item_id)
+        return True
+
+
+def parse_rules(configured: list[dict]) -> list[Rule]:
+    """Builds rules from the [[slideshow.rules]] tables, skipping invalid ones."""
+    rules = []
+    for opts in configured:
+        try:
+            rules.append(Rule.from_config(opts))
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            log.warning("Ignoring slideshow rule %s: %s", opts, e)
+    return rules
+
+
+class Scheduler:
+    """
+    Picks the wallpapers for one output, or for all outputs at once.
+
+    Shuffled playback draws a random wallpaper on each tick instead of
+    shuffling the whole list, skipping recently shown ones and favoring
+    favorites. Time-of-day rules limit the brightness of what is picked.
+    Everything shown is kept in a bounded history for prev and next.
+    """
+
+    def __init__(self, catalog: Catalog, ids: array, interval: float, shuffle: bool,
+                 history_size: int = 50, favorite_weight: float = 1.0, rules: list[Rule] = ()):
+        self.catalog = catalog
+        self.ids = array('I')
+        self.interval = interval
+        self.due = 0.0 # Monotonic time of the next change
+
+        self.history = deque(maxlen=max(1, history_size))
+        self.cursor = -1 # Position of the current wallpaper in the history
+        self.position = -1 # Position in ids, for ordered playback
+        self._picks = 0
+        self._last_picked: dict[int, int] = {}
+
+        self.configure(interval, shuffle, history_size, favorite_weight, rules)
+        self.set_ids(ids)
+
+    def configure(self, interval: float, shuffle: bool, history_size: int,
+                  favorite_weight: float, rules: list[Rule] = ()):
+        """Applies new settings, moving the next change to match a new interval."""
+        if self.history:
+            self.due += interval - self.interval
+        self.interval = interval
+        self.shuffle = shuffle
+        self.history_size = max(1, history_size)
+        self.favorite_weight = favorite_weight
+        self.rules = list(rules)
+
+        if self.history_size != self.history.maxlen:
+            dropped = max(0, len(self.history) - self.history_size)
+            self.history = deque(self.history, maxlen=self.history_size)
+            self.cursor = max(0, self.cursor - dropped) if self.history else -1
+        self._update_pools()
+
+    def set_ids(self, ids: array):
+        """
+        Switches to a new list of wallpapers. Wallpapers no longer in it leave
+        the history; the position in the history and in the order is kept.
+        """
+        allowed = set(ids)
+        kept = [(n <= self.cursor, item_id) for n, item_id in enumerate(self.history) if item_id in allowed]
+        self.history = deque((item_id for _, item_id in kept), maxlen=self.history_size)
+        self.cursor = sum(before for before, _ in kept) - 1
+        self._last_picked = {i: n for i, n in self._last_picked.items() if i in allowed}
+
+        # Ordered playback carries on after the same wallpaper, or after the
+        # one that preceded it if it is gone
+        if 0 <= self.position < len(self.ids) and self.ids[self.position] in allowed:
+            self.position = ids.index(self.ids[self.position])
+        else:
+            self.position = max(-1, min(self.position, len(ids)) - 1)
+        self.ids = ids
+        self._update_pools()
+
+    def _update_pools(self):
+        ids = self.ids
+        # Favorites are drawn from their own pool, so each one ends up
+        # favorite_weight times as likely as any other wallpaper
+        self.favorites = array('I', (i for i in ids if self.catalog.has_flag(i, FLAG_FAVORITE)))
+        extra = max(0.0, self.favorite_weight - 1) * len(self.favorites)
+        self.favorite_chance = extra / (len(ids) + extra) if ids else 0.0
+
+        # A wallpaper counts as recent until this many others have been picked.
+        # Favorites get a window sized to their own pool, or they would rarely
+        # be allowed to come round again
+        self.recent_window = min(self.history_size, len(ids) // 2)
+        self.favorite_window = min(self.recent_window, len(self.favorites) // 2)
+
+    def next(self) -> int:
+        """Returns the next wallpaper, retracing the history first if prev() was used."""
+        if self.cursor < len(self.history) - 1:
+            self.cursor += 1
+            return self.history[self.cursor]
+
+        item_id = self._pick()
+        self.history.append(item_id)
+        self.cursor = len(self.history) - 1
+        self._last_picked[item_id] = self._picks
+        self._picks += 1
+        log.debug("Picked '%s'.", self.catalog.path(item_id))
+        return item_id
+
+    def prev(self) -> int | None:
+        """Returns the previously shown wallpaper, or None at the start of the history."""
+        if self.cursor <= 0:
+            return None
+        self.cursor -= 1
+        return self.history[self.cursor]
+
+    def _active_rule(self) -> Rule | None:
+        now = time.localtime()
+        minute = now.tm_hour * 60 + now.tm_min
+        for rule in self.rules:
+            if rule.is_active(minute):
+                return rule
+        return None
+
+    def _is_recent(self, item_id: int) -> bool:
+        last = self._last_picked.get(item_id)
+        if last is None:
+            return False
+        is_favorite = self.catalog.has_flag(item_id, FLAG_FAVORITE)
+        return self._picks - last <= (self.favorite_window if is_favorite else self.recent_window)
+
+    def _sample(self) -> int:
+        if self.favorites and random.random() < self.favorite_chance:
+            return random.choice(self.favorites)
+        return random.choice(self.ids)
+
+    def _pick(self) -> int:
+        rule = self._active_rule()
+        accepts = (lambda i: rule.accepts(i, self.catalog.brightness(i))) if rule else (lambda i: True)
+
+        if not self.shuffle:
+            # The next wallpaper in order that the rule allows, looking only a
+            # bounded distance ahead
+            start = self.position
+            for step in range(1, min(MAX_ATTEMPTS, len(self.ids)) + 1):
+                self.position = (start + step) % len(self.ids)
+                if accepts(self.ids[self.position]):
+                    return self.ids[self.position]
+            # None close by: keep the current wallpaper if the rule allows it,
+            # and search on from here at the next tick
+            if self.history and accepts(self.history[-1]):
+                return self.history[-1]
+            # Otherwise walk the order one step, ignoring the rule
+            self.position = (start + 1) % len(self.ids)
+            return self.ids[self.position]
+
+        fallback = None
+        for _ in range(MAX_ATTEMPTS):
+            item_id = self._sample()
+            if not accepts(item_id):
+                continue
+            if not self._is_recent(item_id):
+                return item_id
+            if fallback is None:
+                fallback = item_id
+
+        # Rare matches are remembered as they are found, so even a rule that
+        # few wallpapers pass is honored once some have been seen
+        if rule and rule.matches:
+            for _ in range(MAX_ATTEMPTS):
+                item_id = random.choice(rule.matches)
+                if not self._is_recent(item_id):
+                    return item_id
+            if fallback is None:
+                fallback = random.choice(rule.matches)
+        return fallback if fallback is not None else self._sample()
@@ -3,7 +3,9 @@ import shutil
 import os
 import sys
 import json
+import re
 from .config import Config
+from . import trace
 
 def _run_pywal(file_path: str):
     """Helper function to run pywal if enabled and available."""
@@ -19,38 +21,60 @@ def _run_pywal(file_path: str):
     else:
         print("Warning: 'wal' command not found, skipping pywal integration.")
 
-def detect_monitors() -> list[str]:
-    """Detects connected monitors using swaymsg or xrandr."""
+def detect_outputs() -> dict[str, tuple[int, int] | None]:
+    """
+    Detects connected monitors using swaymsg or xrandr.
+
+    Returns a mapping of output name to its (width, height) in layout pixels,
+    or None where the size could not be determined.
+    """
     # Wayland (Sway) check first
     if shutil.which("swaymsg"):
         try:
             result = subprocess.run(["swaymsg", "-t", "get_outputs", "-r"], check=True, capture_output=True, text=True)
             outputs = json.loads(result.stdout)
-            return [output['name'] for output in outputs if output['active']]
+            detected = {}
+            for output in outputs:
+                if output['active']:
+                    rect = output.get('rect') or {}
+                    size = (rect['width'], rect['height']) if 'width' in rect and 'height' in rect else None
+                    detected[output['name']] = size
+            return detected
         except (subprocess.CalledProcessError, json.JSONDecodeError, KeyError) as e:
             print(f"Swaymsg monitor detection failed: {e}", file=sys.stderr)
             
     # X11 (xrandr) as fallback
     if shutil.which("xrandr"):
-        try:
-            result = subprocess.run(["xrandr", "--query"], check=True, capture_output=True, text=True)
-            monitors = []
-            for line in result.stdout.splitlines():
-                if " connected" in line and not "disconnected" in line:
-                    monitors.append(line.split()[0])
-            return monitors
-        except subprocess.CalledProcessError as e:
-            print(f"Xrandr monitor detection failed: {e}", file=sys.stderr)
-            
-    return []
+        return {name: (w, h) for name, (w, h, x, y) in _xrandr_geometries().items()}
 
+    return {}
 
-def set_wallpaper(file_path: str, config: Config, monitor: str | None = None):
-    """Sets the desktop wallpaper, optionally for a specific monitor."""
-    print(f"Attempting to set wallpaper: {file_path}")
-    if monitor:
-        print(f"Targeting monitor: {monitor}")
-    
+
+def _xrandr_geometries() -> dict[str, tuple[int, int, int, int]]:
+    """
+    Returns (width, height, x, y) for each active X11 output. Connected
+    outputs that are switched off have no geometry and are left out.
+    """
+    try:
+        result = subprocess.run(["xrandr", "--query"], check=True, capture_output=True, text=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Xrandr monitor detection failed: {e}", file=sys.stderr)
+        return {}
+    geometries = {}
+    for line in result.stdout.splitlines():
+        if " connected" in line and not "disconnected" in line:
+            if geometry := re.search(r"(\d+)x(\d+)\+(\d+)\+(\d+)", line):
+                geometries[line.split()[0]] = tuple(int(g) for g in geometry.groups())
+    return geometries
+
+
+def detect_monitors() -> list[str]:
+    """Detects connected monitors using swaymsg or xrandr."""
+    return list(detect_outputs())
+
+
+def _resolve_setter(config: Config) -> str:
+    """Returns the configured setter, resolving 'auto' for the current environment."""
     setter = config.setter
     
     # Auto-detection logic
@@ -73,57 +97,136 @@ def set_wallpaper(file_path: str, config: Config, monitor: str | None = None):
         if setter == "auto" and shutil.which("feh"):
             setter = "feh"
 
+    return setter
+
+
+def set_wallpaper(file_path: str, config: Config, monitor: str | None = None):
+    """Sets the desktop wallpaper, optionally for a specific monitor."""
+    print(f"Attempting to set wallpaper: {file_path}")
+    if monitor:
+        print(f"Targeting monitor: {monitor}")
+    
+    setter = _resolve_setter(config)
+
     # --- Execute Setter Command ---
     setter_success = False
-    try:
-        if setter == "feh":
-            if monitor:
-                print("Warning: 'feh' setter does not support specific monitors. Applying to all.")
-            if not shutil.which("feh"):
-                print("Error: 'feh' command not found.")
-                return
-            subprocess.run(["feh", "--bg-fill", file_path], check=True)
-            print("Successfully set wallpaper using feh.")
-            setter_success = True
-
-        elif setter == "swaybg":
-            if monitor:
-                print("Warning: 'swaybg' is not ideal for multi-monitor. Use 'swaymsg'. Applying to all outputs.")
-            if not shutil.which("swaybg"):
-                print("Error: 'swaybg' command not found.")
-                return
-            subprocess.run(["pkill", "swaybg"], check=False)
-            subprocess.Popen(["swaybg", "-i", file_path, "-m", "fill"])
-            print("Successfully set wallpaper using swaybg.")
-            setter_success = True
+    with trace.span("set_wallpaper", setter=setter):
+        try:
+            if setter == "feh":
+                if monitor:
+                    print("Warning: 'feh' setter does not support specific monitors. Applying to all.")
+                if not shutil.which("feh"):
+                    print("Error: 'feh' command not found.")
+                    return
+                subprocess.run(["feh", "--bg-fill", file_path], check=True)
+                print("Successfully set wallpaper using feh.")
+                setter_success = True
+
+            elif setter == "swaybg":
+                if monitor:
+                    print("Warning: 'swaybg' is not ideal for multi-monitor. Use 'swaymsg'. Applying to all outputs.")
+                if not shutil.which("swaybg"):
+                    print("Error: 'swaybg' command not found.")
+                    return
+                subprocess.run(["pkill", "swaybg"], check=False)
+                subprocess.Popen(["swaybg", "-i", file_path, "-m", "fill"])
+                print("Successfully set wallpaper using swaybg.")
+                setter_success = True
             
-        elif setter == "swaymsg":
-            if not shutil.which("swaymsg"):
-                print("Error: 'swaymsg' command not found.")
-                return
-            target_monitor = monitor if monitor else "*"
-            cmd = f'output "{target_monitor}" bg "{os.path.abspath(file_path)}" fill'
-            subprocess.run(["swaymsg", cmd], check=True)
-            print(f"Successfully set wallpaper for {target_monitor} using swaymsg.")
-            setter_success = True
+            elif setter == "swaymsg":
+                if not shutil.which("swaymsg"):
+                    print("Error: 'swaymsg' command not found.")
+                    return
+                target_monitor = monitor if monitor else "*"
+                cmd = f'output "{target_monitor}" bg "{os.path.abspath(file_path)}" fill'
+                subprocess.run(["swaymsg", cmd], check=True)
+                print(f"Successfully set wallpaper for {target_monitor} using swaymsg.")
+                setter_success = True
             
-        elif setter == "gnome":
-            if monitor:
-                print("Warning: 'gnome' setter does not support specific monitors. Applying to all.")
-            picture_uri = f"file://{os.path.abspath(file_path)}"
-            subprocess.run(["gsettings", "set", "org.gnome.desktop.background", "picture-uri", picture_uri], check=True)
-            subprocess.run(["gsettings", "set", "org.gnome.desktop.background", "picture-uri-dark", picture_uri], check=True)
-            print("Successfully set wallpaper using gsettings (GNOME).")
-            setter_success = True
-
-        else:
-            print(f"Error: Unknown or unsupported setter '{setter}'. Please check your config.")
-            return
+            elif setter == "gnome":
+                if monitor:
+                    print("Warning: 'gnome' setter does not support specific monitors. Applying to all.")
+                picture_uri = f"file://{os.path.abspath(file_path)}"
+                subprocess.run(["gsettings", "set", "org.gnome.desktop.background", "picture-uri", picture_uri], check=True)
+                subprocess.run(["gsettings", "set", "org.gnome.desktop.background", "picture-uri-dark", picture_uri], check=True)
+                print("Successfully set wallpaper using gsettings (GNOME).")
+                setter_success = True
 
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        print(f"Setter command '{setter}' failed: {e}")
-        return
+            else:
+                print(f"Error: Unknown or unsupported setter '{setter}'. Please check your config.")
+                return
+
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Setter command '{setter}' failed: {e}")
+            return
 
     # --- Run Pywal Integration Post-set ---
     if setter_success and config.enable_pywal:
-        _run_pywal(file_path)
\ No newline at end of file
+        _run_pywal(file_path)
+
+
+def set_wallpapers(assignments: dict[str, str], config: Config):
+    """
+    Sets a different wallpaper on each output in a single setter invocation.
+
+    assignments maps output names to image paths and should cover every
+    output, since some setters replace all wallpapers at once. Setters
+    without per-output support fall back to the first image everywhere.
+    """
+    if not assignments:
+        return
+    if len(assignments) == 1:
+        monitor, file_path = next(iter(assignments.items()))
+        set_wallpaper(file_path, config, monitor)
+        return
+
+    print(f"Attempting to set wallpapers: {assignments}")
+    setter = _resolve_setter(config)
+    first_path = next(iter(assignments.values()))
+
+    with trace.span("set_wallpapers", setter=setter, outputs=len(assignments)):
+        try:
+            if setter == "swaymsg":
+                if not shutil.which("swaymsg"):
+                    print("Error: 'swaymsg' command not found.")
+                    return
+                # swaymsg runs a ';'-separated command list in one IPC round trip
+                cmd = "; ".join(f'output "{m}" bg "{os.path.abspath(p)}" fill' for m, p in assignments.items())
+                subprocess.run(["swaymsg", cmd], check=True)
+                print(f"Successfully set wallpapers for {len(assignments)} outputs using swaymsg.")
+
+            elif setter == "swaybg":
+                if not shutil.which("swaybg"):
+                    print("Error: 'swaybg' command not found.")
+                    return
+                cmd = ["swaybg"]
+                for monitor, file_path in assignments.items():
+                    cmd += ["-o", monitor, "-i", file_path, "-m", "fill"]
+                subprocess.run(["pkill", "swaybg"], check=False)
+                subprocess.Popen(cmd)
+                print(f"Successfully set wallpapers for {len(assignments)} outputs using swaybg.")
+
+            elif setter == "feh":
+                if not shutil.which("feh"):
+                    print("Error: 'feh' command not found.")
+                    return
+                # feh assigns one image per Xinerama screen, in the order given.
+                # Screens follow the layout, so order the outputs by position
+                geometries = _xrandr_geometries()
+                outputs = sorted((o for o in assignments if o in geometries),
+                                 key=lambda o: (geometries[o][2], geometries[o][3]))
+                images = [assignments[o] for o in outputs] or list(assignments.values())
+                subprocess.run(["feh", "--bg-fill", *images], check=True)
+                print(f"Successfully set wallpapers for {len(images)} outputs using feh.")
+
+            else:
+                print(f"Warning: '{setter}' setter does not support per-output wallpapers. Applying the first one to all.")
+                set_wallpaper(first_path, config)
+                return
+
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Setter command '{setter}' failed: {e}")
+            return
+
+    if config.enable_pywal:
+        _run_pywal(first_path)
@@ -1,62 +1,91 @@
 from gi.repository import GdkPixbuf, GLib
 import os
-import hashlib
+import logging
+import threading
 from PIL import Image
 import gi
 gi.require_version('Gtk', '4.0')
+from .cache import CACHE_ROOT, get_fingerprint, get_format, set_dimensions, set_brightness
+from . import formats
+from . import trace
+
+log = logging.getLogger(__name__)
 
 
 Image.MAX_IMAGE_PIXELS = None
 
 
-CACHE_DIR = os.path.expanduser("~/.cache/papyr/thumbnails")
+CACHE_DIR = os.path.join(CACHE_ROOT, "thumbnails")
 THUMBNAIL_SIZE = (300, 300)
 
 os.makedirs(CACHE_DIR, exist_ok=True)
 
 
 def get_thumbnail_path(image_path: str) -> str:
-    """Generates a unique, safe filename for the cached thumbnail."""
-    hasher = hashlib.md5(image_path.encode('utf-8'))
-    return os.path.join(CACHE_DIR, f"{hasher.hexdigest()}.png")
+    """
+    Returns the cached thumbnail filename for an image, keyed on its content.
+
+    Identical files share one thumbnail, and renaming or moving a wallpaper
+    keeps its thumbnail valid.
+    """
+    return os.path.join(CACHE_DIR, f"{get_fingerprint(image_path)}.png")
+
+
+# Modes that can be written to the PNG cache as they are
+PNG_MODES = {"1", "L", "LA", "I", "P", "RGB", "RGBA"}
 
 
 def create_thumbnail(original_path: str, cache_path: str):
     """Creates a thumbnail from the original image and saves it to the cache atomically."""
-    temp_path = f"{cache_path}.tmp"
+    temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
     try:
-        with Image.open(original_path) as img:
-            img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-            img.save(temp_path, "PNG")
-        os.rename(temp_path, cache_path)
+        fmt = get_format(original_path)
+        with trace.span("open", format=fmt):
+            img, original_size = formats.open_image(original_path, THUMBNAIL_SIZE, fmt)
+        with img:
+            set_dimensions(original_path, original_size)
+            with trace.span("decode"):
+                img.load()
+            with trace.span("resize"):
+                img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+                thumb = img if img.mode in PNG_MODES else img.convert("RGB")
+            with trace.span("brightness"):
+                # The slideshow's time-of-day rules use it; here it costs almost nothing
+                set_brightness(original_path, formats.mean_brightness(thumb))
+            with trace.span("save"):
+                thumb.save(temp_path, "PNG")
+                os.rename(temp_path, cache_path)
     except Exception as e:
-        print(f"Error creating thumbnail for {original_path}: {e}")
+        log.error("Error creating thumbnail for %s: %s", original_path, e)
         if os.path.exists(temp_path):
             os.remove(temp_path)
 
 
 def get_pixbuf_for_image(image_path: str) -> GdkPixbuf.Pixbuf:
     """Gets a thumbnail, checking the cache first and handling corrupt files."""
-    cache_path = get_thumbnail_path(image_path)
-
     try:
-        original_mtime = os.path.getmtime(image_path)
-        cache_mtime = os.path.getmtime(
-            cache_path) if os.path.exists(cache_path) else 0
-        if original_mtime > cache_mtime:
-            create_thumbnail(image_path, cache_path)
-    except FileNotFoundError:
-        if not os.path.exists(cache_path):
-            create_thumbnail(image_path, cache_path)
+        with trace.span("cache_lookup"):
+            cache_path = get_thumbnail_path(image_path)
+            is_cached = os.path.exists(cache_path)
+    except OSError as e:
+        log.error("Error reading %s: %s", image_path, e)
+        return None
+
+    # The key changes whenever the content does, so an existing file is current
+    if is_cached:
+        trace.count("thumbnail_cache_hit")
+    else:
+        trace.count("thumbnail_cache_miss")
+        create_thumbnail(image_path, cache_path)
 
     if not os.path.exists(cache_path):
         return None
 
     try:
-        pixbuf = GdkPixbuf.Pixbuf.new_from_file(cache_path)
+        with trace.span("thumbnail_read"):
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file(cache_path)
         return pixbuf
     except GLib.Error:
-        print(
-            f"CRITICAL: Caught corrupt cache file for {image_path}. Deleting.")
+        log.critical("Caught corrupt cache file for %s. Deleting.", image_path)
         os.remove(cache_path)
         return None
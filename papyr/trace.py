@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import Counter
+from contextlib import nullcontext
+
+LOG_ENV = "PAPYR_LOG"
+TRACE_ENV = "PAPYR_TRACE"
+SUMMARY_ENV = "PAPYR_TRACE_SUMMARY"
+
+_enabled = False
+_lock = threading.Lock()
+_events = []
+_counters = Counter()
+_pid = os.getpid()
+_origin_ns = time.perf_counter_ns()
+
+# Returned by span() while tracing is off, so disabled spans cost one call
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    """Times a block and records it as a Chrome trace 'complete' event."""
+
+    __slots__ = ("name", "args", "start_ns")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": (self.start_ns - _origin_ns) / 1000,
+            "dur": (end_ns - self.start_ns) / 1000,
+            "pid": _pid,
+            "tid": threading.get_native_id(),
+        }
+        if self.args:
+            event["args"] = self.args
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def span(name: str, **args):
+    """Returns a context manager that records how long its block takes."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def count(name: str, n: int = 1):
+    """Increments a named counter, such as cache hits or misses."""
+    if _enabled:
+        with _lock:
+            _counters[name] += n
+
+
+def mark(name: str, **args):
+    """Records an instant event, such as the first thumbnail appearing."""
+    if _enabled:
+        event = {
+            "name": name,
+            "ph": "i",
+            "s": "p",
+            "ts": (time.perf_counter_ns() - _origin_ns) / 1000,
+            "pid": _pid,
+            "tid": threading.get_native_id(),
+        }
+        if args:
+            event["args"] = args
+        with _lock:
+            _events.append(event)
+
+
+def summary() -> dict:
+    """Aggregates recorded spans per name, along with the counters."""
+    spans = {}
+    with _lock:
+        events = list(_events)
+        counters = dict(_counters)
+    for event in events:
+        if event["ph"] == "X":
+            entry = spans.setdefault(event["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            duration_ms = event["dur"] / 1000
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        elif event["ph"] == "i":
+            spans.setdefault(event["name"], {"at_ms": event["ts"] / 1000})
+    for entry in spans.values():
+        if "count" in entry:
+            entry["mean_ms"] = entry["total_ms"] / entry["count"]
+    return {"pid": _pid, "spans": spans, "counters": counters}
+
+
+def export_chrome_trace(path: str):
+    """Writes all events in the Chrome trace format (chrome://tracing, Perfetto)."""
+    with _lock:
+        events = list(_events)
+        counters = dict(_counters)
+    if counters:
+        events.append({
+            "name": "counters",
+            "ph": "C",
+            "ts": (time.perf_counter_ns() - _origin_ns) / 1000,
+            "pid": _pid,
+            "args": counters,
+        })
+    _write_json(path, {"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+def export_summary(path: str):
+    """Writes the aggregated span timings and counters as JSON."""
+    _write_json(path, summary())
+
+
+def _write_json(path: str, data: dict):
+    try:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1)
+    except OSError as e:
+        print(f"Could not write trace to {path}: {e}", file=sys.stderr)
+
+
+def _expand_path(path: str) -> str:
+    """Expands '~' and replaces '%p' with the process ID, so the GUI and daemon can share a setting."""
+    return os.path.expanduser(path).replace("%p", str(_pid))
+
+
+def configure():
+    """
+    Sets up logging and tracing from the environment.
+
+    PAPYR_LOG takes a level name (e.g. 'debug'). PAPYR_TRACE and
+    PAPYR_TRACE_SUMMARY take output paths for a Chrome trace and a JSON
+    summary, written when the process exits. All are off by default.
+    """
+    global _enabled
+
+    level = os.environ.get(LOG_ENV)
+    if level:
+        logging.basicConfig(
+            level=getattr(logging, level.upper(), logging.DEBUG),
+            format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+        )
+
+    trace_path = os.environ.get(TRACE_ENV)
+    summary_path = os.environ.get(SUMMARY_ENV)
+    if trace_path or summary_path:
+        _enabled = True
+        if trace_path:
+            atexit.register(export_chrome_trace, _expand_path(trace_path))
+        if summary_path:
+            atexit.register(export_summary, _expand_path(summary_path))
@@ -0,0 +1,97 @@
+import os
+import ctypes
+import ctypes.util
+import struct
+import logging
+
+log = logging.getLogger(__name__)
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: wd, mask, cookie, len, then a NUL-padded name
+_EVENT = struct.Struct("iIII")
+
+
+def _inotify_watch(directory: str) -> int:
+    """Returns a non-blocking inotify fd watching directory for finished writes, renames and deletions."""
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    # Watching the directory rather than the files catches atomic replaces
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        errno = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(errno, f"inotify_add_watch failed for {directory}")
+    return fd
+
+
+class FileWatcher:
+    """
+    Reports which of a set of files in one directory have changed.
+
+    Uses inotify where available, so the caller can sleep on fileno() until
+    something happens. Otherwise it falls back to comparing modification
+    times every POLL_INTERVAL seconds.
+    """
+
+    POLL_INTERVAL = 5.0
+
+    def __init__(self, paths: list[str]):
+        self.directory = os.path.dirname(paths[0])
+        self.names = {os.path.basename(p): p for p in paths}
+        self.fd = None
+        self._mtimes = self._stat_all()
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            self.fd = _inotify_watch(self.directory)
+        except (OSError, AttributeError) as e: # AttributeError: libc without inotify
+            log.info("Cannot watch %s with inotify (%s). Polling every %.0fs.", self.directory, e, self.POLL_INTERVAL)
+
+    @property
+    def poll_interval(self) -> float | None:
+        """How often changed() must be called, or None if fileno() wakes the caller."""
+        return None if self.fd is not None else self.POLL_INTERVAL
+
+    def fileno(self) -> int | None:
+        return self.fd
+
+    def _stat_all(self) -> dict:
+        mtimes = {}
+        for name, path in self.names.items():
+            try:
+                mtimes[name] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[name] = None
+        return mtimes
+
+    def changed(self) -> set[str]:
+        """Returns the paths that changed since the last call."""
+        if self.fd is None:
+            mtimes = self._stat_all()
+            names = {name for name in mtimes if mtimes[name] != self._mtimes[name]}
+            self._mtimes = mtimes
+            return {self.names[name] for name in names}
+
+        names = set()
+        try:
+            while data := os.read(self.fd, 4096):
+                offset = 0
+                while offset < len(data):
+                    _, _, _, length = _EVENT.unpack_from(data, offset)
+                    offset += _EVENT.size
+                    names.add(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+                    offset += length
+        except BlockingIOError:
+            pass
+        return {self.names[name] for name in names if name in self.names}
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
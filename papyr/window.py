@@ -1,14 +1,18 @@
-import sys
 import os
+import logging
 import threading
+from array import array
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, Gdk, GLib, GObject, Gio, GdkPixbuf
-from .config import Config, IGNORE_LIST_PATH, ORDER_LIST_PATH
+from .config import Config
 from . import thumbnailer
+from . import cache
 from . import setter
+from . import trace
+from .model import Catalog, FLAG_IGNORED, FLAG_FAVORITE
 
-VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+log = logging.getLogger(__name__)
 
 class PapyrWindow(Gtk.ApplicationWindow):
     """The main window for the Papyr application."""
@@ -16,15 +20,18 @@ class PapyrWindow(Gtk.ApplicationWindow):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
-        print("--- DEBUG: Initializing PapyrWindow ---")
+        log.debug("Initializing PapyrWindow")
         self.config = Config()
         self.monitors = setter.detect_monitors()
-        print(f"DEBUG __init__: Detected monitors: {self.monitors}")
+        log.debug("Detected monitors: %s", self.monitors)
 
         self._setup_actions()
-        self.load_persistent_lists()
-        self.all_discovered_paths = self.discover_images()
+        self.catalog = Catalog.load(self.config)
+        log.debug("Found %d images.", len(self.catalog))
         self.is_showing_ignored = False
+        # Catalog ids of the FlowBox children, index for index
+        self.shown_ids = array('I')
+        self._load_generation = 0
 
         self.set_default_size(1000, 700)
         self.set_title("Papyr")
@@ -34,7 +41,7 @@ class PapyrWindow(Gtk.ApplicationWindow):
         try:
             self.set_property("always-on-top", True)
         except Exception:
-            print("DEBUG __init__: WM does not support 'always-on-top'.")
+            log.debug("WM does not support 'always-on-top'.")
             pass
             
         main_vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
@@ -75,11 +82,10 @@ class PapyrWindow(Gtk.ApplicationWindow):
         self.flowbox.add_controller(click_controller)
         
         self.connect("map", self.on_map)
-        print("DEBUG __init__: Widget setup complete.")
+        log.debug("Widget setup complete.")
         self.start_thumbnail_loading()
 
     def _setup_actions(self):
-        print("DEBUG _setup_actions: Setting up Gio.SimpleActions.")
         action_close = Gio.SimpleAction.new("close", None)
         action_close.connect("activate", lambda a, v: self.close())
         self.add_action(action_close)
@@ -88,6 +94,10 @@ class PapyrWindow(Gtk.ApplicationWindow):
         action_toggle.connect("activate", lambda a, v: self._toggle_selected_item_ignore_status())
         self.add_action(action_toggle)
 
+        action_favorite = Gio.SimpleAction.new("toggle_favorite", None)
+        action_favorite.connect("activate", lambda a, v: self._toggle_selected_item_favorite())
+        self.add_action(action_favorite)
+
         action_reorder_up = Gio.SimpleAction.new("reorder_up", None)
         action_reorder_up.connect("activate", lambda a,v: self._reorder_selected_item(-1))
         self.add_action(action_reorder_up)
@@ -100,74 +110,62 @@ class PapyrWindow(Gtk.ApplicationWindow):
         set_monitor_action.connect("activate", self._on_set_for_monitor)
         self.add_action(set_monitor_action)
 
-    def load_persistent_lists(self):
-        print("DEBUG: Loading ignore and order lists.")
-        try:
-            with open(IGNORE_LIST_PATH, 'r') as f: self.ignore_list = set(line.strip() for line in f)
-        except FileNotFoundError: self.ignore_list = set()
-        try:
-            with open(ORDER_LIST_PATH, 'r') as f: self.order_list = [line.strip() for line in f if line.strip()]
-        except FileNotFoundError: self.order_list = []
-
-    def discover_images(self) -> list[str]:
-        print("DEBUG: Discovering images.")
-        ordered_set, found_images = set(self.order_list), set()
-        for directory in self.config.wallpaper_dirs:
-            try:
-                for entry in os.scandir(directory):
-                    if entry.is_file() and os.path.splitext(entry.name)[1].lower() in VALID_EXTENSIONS:
-                        found_images.add(entry.path)
-            except OSError as e: print(f"ERROR: Cannot scan {directory}: {e}", file=sys.stderr)
-        final_list = [path for path in self.order_list if path in found_images]
-        final_list.extend(sorted(list(found_images - ordered_set)))
-        print(f"DEBUG: Found {len(final_list)} images.")
-        return final_list
-
     def start_thumbnail_loading(self):
-        print("DEBUG: Starting background thumbnail loading.")
+        log.debug("Starting background thumbnail loading.")
+        # Loaders from a previous view stop at their next item
+        self._load_generation += 1
         self.flowbox.remove_all()
-        paths = [p for p in self.all_discovered_paths if (p in self.ignore_list if self.is_showing_ignored else p not in self.ignore_list)]
+        self.shown_ids = array('I')
+        ids = self.catalog.view(ignored=self.is_showing_ignored)
         self.set_title(f"Papyr{' (Ignored)' if self.is_showing_ignored else ''}")
-        threading.Thread(target=self._thumbnail_loader_thread, args=(paths,), daemon=True).start()
-
-    def _thumbnail_loader_thread(self, paths):
-        for path in paths:
-            if pixbuf := thumbnailer.get_pixbuf_for_image(path):
-                GLib.idle_add(self.add_wallpaper_to_flowbox, pixbuf, path)
-
-    def add_wallpaper_to_flowbox(self, pixbuf, path):
+        threading.Thread(target=self._thumbnail_loader_thread, args=(ids, self._load_generation), daemon=True).start()
+
+    def _thumbnail_loader_thread(self, ids, generation):
+        with trace.span("load_thumbnails", count=len(ids)):
+            for item_id in ids:
+                if generation != self._load_generation:
+                    break
+                if pixbuf := thumbnailer.get_pixbuf_for_image(self.catalog.path(item_id)):
+                    GLib.idle_add(self.add_wallpaper_to_flowbox, pixbuf, item_id, generation)
+        cache.save_index()
+
+    def add_wallpaper_to_flowbox(self, pixbuf, item_id, generation):
+        if generation != self._load_generation:
+            return
         # --- PERMANENT FIX FOR 'pixbuf' PROPERTY CRASH ---
-        picture = Gtk.Picture()
-        picture.set_pixbuf(pixbuf)
-        picture.set_can_shrink(False)
+        with trace.span("texture_upload"):
+            picture = Gtk.Picture()
+            picture.set_pixbuf(pixbuf)
+            picture.set_can_shrink(False)
         # --- END FIX ---
         
         child = Gtk.FlowBoxChild(child=picture)
-        # --- PERMANENT FIX FOR SETTING CUSTOM ATTRIBUTE ---
-        child.path = path
-        # --- END FIX ---
-
-        self.flowbox.insert(child, -1)
+        if self.catalog.has_flag(item_id, FLAG_FAVORITE):
+            child.add_css_class("favorite-item")
+        # The search filter runs inside insert() and looks the child's id up by index
+        self.shown_ids.append(item_id)
+        with trace.span("flowbox_insert"):
+            self.flowbox.insert(child, -1)
         if child.get_index() == 0:
-            print("DEBUG: First item added. Deferring selection until map.")
+            trace.mark("first_thumbnail")
+            log.debug("First item added. Deferring selection until map.")
     
     def on_key_pressed(self, controller, keyval, keycode, state):
-        key_name = Gdk.keyval_name(keyval)
         is_ctrl = bool(state & Gdk.ModifierType.CONTROL_MASK)
-        focused = self.get_focus()
-        print(f"DEBUG on_key_pressed: Key='{key_name}', Ctrl={is_ctrl}, focused='{type(focused).__name__}'")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Key='%s', Ctrl=%s, focused='%s'", Gdk.keyval_name(keyval), is_ctrl, type(self.get_focus()).__name__)
 
         if keyval == Gdk.KEY_Escape:
-            print("DEBUG on_key_pressed: Escape pressed, closing.")
+            log.debug("Escape pressed, closing.")
             self.close()
             return True
         
         if self.search_entry.has_focus():
-             print("DEBUG on_key_pressed: Search has focus, letting it handle key.")
              return False # Let the search entry process the key press
 
         if is_ctrl:
             if keyval == Gdk.KEY_i: self._toggle_ignore_view(); return True
+            if keyval == Gdk.KEY_f: self._toggle_selected_item_favorite(); return True
             if keyval == Gdk.KEY_j: self._reorder_selected_item(1); return True
             if keyval == Gdk.KEY_k: self._reorder_selected_item(-1); return True
         elif keyval == Gdk.KEY_Delete: self._toggle_selected_item_ignore_status(); return True
@@ -178,9 +176,11 @@ class PapyrWindow(Gtk.ApplicationWindow):
     def on_right_click(self, gesture, n_press, x, y):
         child = self.flowbox.get_child_at_pos(x, y)
         if not child: return
-        print(f"DEBUG on_right_click: Menu for '{os.path.basename(child.path)}'")
+        item_id = self.shown_ids[child.get_index()]
+        log.debug("Context menu for '%s'", self.catalog.path(item_id))
         self.flowbox.select_child(child)
-        menu = self._build_context_menu(child.path in self.ignore_list)
+        menu = self._build_context_menu(self.catalog.has_flag(item_id, FLAG_IGNORED),
+                                        self.catalog.has_flag(item_id, FLAG_FAVORITE))
         
         # This two-step process with attachment to the toplevel window is crash-proof
         popover = Gtk.PopoverMenu(menu_model=menu)
@@ -188,8 +188,7 @@ class PapyrWindow(Gtk.ApplicationWindow):
         popover.set_pointing_to(child.get_allocation())
         popover.popup()
 
-    def _build_context_menu(self, is_ignored):
-        print("DEBUG: Building context menu.")
+    def _build_context_menu(self, is_ignored, is_favorite):
         menu = Gio.Menu.new()
         if self.monitors:
             submenu = Gio.Menu.new()
@@ -207,28 +206,37 @@ class PapyrWindow(Gtk.ApplicationWindow):
             menu.append_section(None, Gio.Menu.new())
         
         menu.append("Un-ignore" if is_ignored else "Ignore", "win.toggle_ignore")
+        menu.append("Unfavorite (Ctrl+F)" if is_favorite else "Favorite (Ctrl+F)", "win.toggle_favorite")
         if not self.is_showing_ignored:
             menu.append_section(None, Gio.Menu.new())
             menu.append("Move Up (Ctrl+K)", "win.reorder_up")
             menu.append("Move Down (Ctrl+J)", "win.reorder_down")
         return menu
 
+    def _selected_id(self) -> int | None:
+        """Returns the catalog id of the selected wallpaper, if any."""
+        if not (selected := self.flowbox.get_selected_children()): return None
+        return self.shown_ids[selected[0].get_index()]
+
     def _reorder_selected_item(self, direction):
         if not (selected := self.flowbox.get_selected_children()): return
         child = selected[0]
-        pos, new_pos = child.get_index(), max(0, child.get_index() + direction)
-        print(f"DEBUG reorder: Moving '{os.path.basename(child.path)}' from {pos} to {new_pos}")
+        pos = child.get_index()
+        new_pos = max(0, min(pos + direction, len(self.shown_ids) - 1))
+        if new_pos == pos: return
+        item_id = self.shown_ids.pop(pos)
+        log.debug("Moving '%s' from %d to %d", self.catalog.path(item_id), pos, new_pos)
         
         self.flowbox.remove(child)
+        self.shown_ids.insert(new_pos, item_id)
         self.flowbox.insert(child, new_pos)
         self.flowbox.select_child(child)
         
-        order = [c.path for c in self.flowbox]
-        self.save_list_to_file(ORDER_LIST_PATH, order)
+        self.catalog.reorder(self.shown_ids)
+        self.catalog.save_order_list()
 
     def on_selection_changed(self, flowbox):
         if not (selected := flowbox.get_selected_children()): return
-        print(f"DEBUG on_selection_changed: Scheduling scroll for '{os.path.basename(selected[0].path)}'.")
         GLib.idle_add(self._scroll_to_child, selected[0])
 
     def _scroll_to_child(self, child):
@@ -241,19 +249,16 @@ class PapyrWindow(Gtk.ApplicationWindow):
         
         if alloc.y < upper:
             new_val = alloc.y
-            print(f"DEBUG scroll: Child above view. Scrolling UP to {new_val}.")
             vadj.set_value(new_val)
         elif alloc.y + alloc.height > upper + page:
             new_val = max(0, alloc.y + alloc.height - page)
-            print(f"DEBUG scroll: Child below view. Scrolling DOWN to {new_val}.")
             vadj.set_value(new_val)
         
         child.grab_focus()
-        print(f"DEBUG scroll: Focus grabbed by '{os.path.basename(child.path)}'")
         return GLib.SOURCE_REMOVE
 
     def on_map(self, widget):
-        print("DEBUG on_map: Window mapped. Focusing search entry and selecting first item.")
+        log.debug("Window mapped. Focusing search entry and selecting first item.")
         self.search_entry.grab_focus()
         if child := self.flowbox.get_child_at_index(0):
             self.flowbox.select_child(child)
@@ -266,48 +271,58 @@ class PapyrWindow(Gtk.ApplicationWindow):
         GLib.timeout_add(250, self.check_focus_and_close)
     
     def check_focus_and_close(self):
-        focus = self.get_focus()
-        has_focus = focus is not None
-        print(f"DEBUG check_focus: Window has_focus={self.has_focus()}, focused widget='{type(focus).__name__}'")
         if not self.has_focus():
-            print("DEBUG check_focus: Window reports no focus. Closing.")
+            log.debug("Window reports no focus. Closing.")
             self.close()
         return GLib.SOURCE_REMOVE # Prevents the timer from running repeatedly
 
     def on_child_activated(self, flowbox, child):
-        setter.set_wallpaper(child.path, self.config)
+        setter.set_wallpaper(self.catalog.path(self.shown_ids[child.get_index()]), self.config)
         self.close()
 
     def on_search_changed(self, search_entry):
         query = search_entry.get_text().lower()
-        print(f"DEBUG on_search_changed: Filtering with '{query}'")
-        self.flowbox.set_filter_func(lambda c: not query or query in os.path.basename(c.path).lower())
+        self.flowbox.set_filter_func(
+            lambda c: not query or query in os.path.basename(self.catalog.path(self.shown_ids[c.get_index()])).lower())
         self.flowbox.invalidate_filter()
 
     def _toggle_ignore_view(self):
-        print("DEBUG: Toggling ignore view.")
+        log.debug("Toggling ignore view.")
         self.is_showing_ignored = not self.is_showing_ignored
         self.start_thumbnail_loading()
 
     def _toggle_selected_item_ignore_status(self):
         if not (selected := self.flowbox.get_selected_children()): return
-        path = selected[0].path
-        print(f"DEBUG: Toggling ignore for '{os.path.basename(path)}'")
-        if path in self.ignore_list: self.ignore_list.remove(path)
-        else: self.ignore_list.add(path)
-        self.save_list_to_file(IGNORE_LIST_PATH, self.ignore_list)
-        self.start_thumbnail_loading()
+        child = selected[0]
+        index = child.get_index()
+        item_id = self.shown_ids[index]
+        log.debug("Toggling ignore for '%s'", self.catalog.path(item_id))
+        self.catalog.set_flag(item_id, FLAG_IGNORED, not self.catalog.has_flag(item_id, FLAG_IGNORED))
+        self.catalog.save_ignore_list()
 
-    def save_list_to_file(self, file_path, item_list):
-        print(f"DEBUG: Saving {len(item_list)} items to {file_path}")
-        try:
-            with open(file_path, 'w') as f: f.write('\n'.join(item_list) + '\n')
-        except IOError as e: print(f"ERROR: Could not save to {file_path}: {e}", file=sys.stderr)
+        # The item now belongs to the other view; drop just that child instead of reloading
+        self.flowbox.remove(child)
+        del self.shown_ids[index]
+        if next_child := self.flowbox.get_child_at_index(min(index, len(self.shown_ids) - 1)):
+            self.flowbox.select_child(next_child)
     
-    def _show_fullscreen_preview(self):
+    def _toggle_selected_item_favorite(self):
         if not (selected := self.flowbox.get_selected_children()): return
-        path = selected[0].path
-        print(f"DEBUG: Previewing '{os.path.basename(path)}'")
+        child = selected[0]
+        item_id = self.shown_ids[child.get_index()]
+        is_favorite = not self.catalog.has_flag(item_id, FLAG_FAVORITE)
+        log.debug("Setting favorite=%s for '%s'", is_favorite, self.catalog.path(item_id))
+        self.catalog.set_flag(item_id, FLAG_FAVORITE, is_favorite)
+        self.catalog.save_favorite_list()
+        if is_favorite:
+            child.add_css_class("favorite-item")
+        else:
+            child.remove_css_class("favorite-item")
+
+    def _show_fullscreen_preview(self):
+        if (item_id := self._selected_id()) is None: return
+        path = self.catalog.path(item_id)
+        log.debug("Previewing '%s'", path)
         
         win = Gtk.Window(transient_for=self, decorated=False, modal=True)
         # --- PERMANENT FIX FOR `filename` PROPERTY CRASH ---
@@ -329,8 +344,8 @@ class PapyrWindow(Gtk.ApplicationWindow):
         pass
 
     def _on_set_for_monitor(self, action, parameter):
-        if not (selected := self.flowbox.get_selected_children()): return
+        if (item_id := self._selected_id()) is None: return
         monitor = parameter.get_string()
-        print(f"DEBUG: Setting wallpaper for monitor: {monitor}")
-        setter.set_wallpaper(selected[0].path, self.config, monitor if monitor != "all" else None)
+        log.debug("Setting wallpaper for monitor: %s", monitor)
+        setter.set_wallpaper(self.catalog.path(item_id), self.config, monitor if monitor != "all" else None)
         self.close()
\ No newline at end of file